@@ -1,32 +1,45 @@
 # Логика аутентификации (JWT-токены)
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 
-from jose import jwt, JWTError
-from passlib.context import CryptContext
 from fastapi import Depends, Request, HTTPException, status
 from app.core.config import settings
+from app.core.hashing import password_hasher
 from app.db.models import User
-from app.services.user_service import UserService
-
-# Настройка контекста для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.services.user_service import UserService, principal_cache
 
 # Константы для JWT-токенов
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
+# Claims, по которым пользователь авторизуется без запроса к базе данных
+PRINCIPAL_CLAIMS = ("uid", "is_admin", "tv")
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Личность и роль пользователя, полученные из claims токена
+    """
+    id: int
+    email: str
+    is_admin: bool
+
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, user: Optional[User] = None):
     """
     Создает JWT-токен для аутентификации пользователя.
 
     :param data: Данные для включения в токен
     :param expires_delta: Время жизни токена
+    :param user: Пользователь, чьи id, роль и версия токенов встраиваются в токен (claims uid, is_admin, tv)
     :return: Сгенерированный JWT-токен в виде строки
     """
     to_encode = data.copy()
+    if user is not None:
+        to_encode.update({"uid": user.id, "is_admin": user.is_admin, "tv": user.token_version})
     if expires_delta:
         # Если передано конкретное время жизни токена
         expire = datetime.utcnow() + expires_delta
@@ -35,12 +48,14 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     # Добавляем время истечения токена в данные для кодирования
     to_encode.update({"exp": expire})
-    # Кодируем данные в JWT-токен
+    # Кодируем данные в JWT-токен (jose вместе с cryptography загружается при первом использовании)
+    from jose import jwt
+
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Проверяет соответствие введенного пароля и хеша из базы данных.
 
@@ -48,25 +63,25 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     :param hashed_password: Хеш пароля из базы данных
     :return: True, если пароль верен, иначе False
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return await password_hasher.verify(plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """
     Генерирует хеш для заданного пароля.
 
     :param password: Пароль пользователя
     :return: Хеш пароля
     """
-    return pwd_context.hash(password)
+    return await password_hasher.hash(password)
 
 
-async def get_current_user(request: Request) -> User:
+def decode_access_token(request: Request) -> dict:
     """
-    Извлекает текущего пользователя из JWT-токена, хранящегося в cookies.
+    Извлекает и декодирует JWT-токен из cookies.
 
     :param request: Объект запроса FastAPI
-    :return: Объект пользователя из базы данных
+    :return: Данные токена (payload) с обязательным email пользователя в sub
     """
     # Извлекаем токен из cookies
     token = request.cookies.get("access_token")
@@ -76,41 +91,96 @@ async def get_current_user(request: Request) -> User:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Не аутентифицирован",
         )
+    from jose import JWTError, jwt
+
     try:
         # Декодируем JWT-токен
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        # Извлекаем email пользователя из payload
-        email: str = payload.get("sub")
-        if email is None:
-            # Если email отсутствует в токене, выбрасываем исключение
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Неверные учетные данные",
-            )
     except JWTError:
         # Если произошла ошибка при декодировании токена, выбрасываем исключение
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверные учетные данные",
         )
-
-    # Получаем пользователя из базы данных по email
-    user = await UserService.get_user_by_email(email)
-    if user is None:
-        # Если пользователь не найден, выбрасываем исключение
+    if payload.get("sub") is None:
+        # Если email отсутствует в токене, выбрасываем исключение
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Пользователь не найден",
+            detail="Неверные учетные данные",
         )
+    return payload
+
+
+def _token_revoked() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Токен отозван, войдите заново",
+    )
+
+
+async def load_user_by_email(email: str) -> User:
+    """
+    Загружает пользователя по email из токена: сначала из кэша, затем из базы данных.
+
+    :param email: Email пользователя (claim sub)
+    :return: Объект пользователя из базы данных
+    """
+    user = principal_cache.get(email)
+    if user is None:
+        user = await UserService.get_user_by_email(email)
+        if user is None:
+            # Если пользователь не найден, выбрасываем исключение
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Пользователь не найден",
+            )
+        principal_cache.set(email, user)
+    return user
+
+
+async def _load_token_user(payload: dict) -> User:
+    user = await load_user_by_email(payload["sub"])
+    # Токен выпущен до отзыва (смены роли, пароля или email)
+    if "tv" in payload and payload["tv"] != user.token_version:
+        raise _token_revoked()
     return user
 
 
-async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_user(request: Request) -> User:
+    """
+    Извлекает текущего пользователя из JWT-токена, хранящегося в cookies.
+
+    :param request: Объект запроса FastAPI
+    :return: Объект пользователя из базы данных
+    """
+    payload = decode_access_token(request)
+    return await _load_token_user(payload)
+
+
+async def get_current_principal(request: Request) -> Principal:
+    """
+    Определяет текущего пользователя по claims токена без загрузки записи из базы данных.
+    Отзыв проверяется по кэшированной версии токенов пользователя.
+    Для токенов без claims (выпущенных ранее) пользователь загружается как в get_current_user.
+
+    :param request: Объект запроса FastAPI
+    :return: Личность и роль текущего пользователя
+    """
+    payload = decode_access_token(request)
+    if all(claim in payload for claim in PRINCIPAL_CLAIMS):
+        if await UserService.get_token_version(payload["uid"]) != payload["tv"]:
+            raise _token_revoked()
+        return Principal(id=payload["uid"], email=payload["sub"], is_admin=payload["is_admin"])
+    user = await _load_token_user(payload)
+    return Principal(id=user.id, email=user.email, is_admin=user.is_admin)
+
+
+async def get_current_admin(current_user: Principal = Depends(get_current_principal)) -> Principal:
     """
     Проверяет, что текущий пользователь является администратором.
 
-    :param current_user: Объект текущего пользователя, полученный из зависимости get_current_user
-    :return: Объект пользователя, если он является администратором
+    :param current_user: Текущий пользователь, полученный из зависимости get_current_principal
+    :return: Текущий пользователь, если он является администратором
     """
     if not current_user.is_admin:
         # Если пользователь не администратор, выбрасываем исключение о запрете доступа
@@ -118,5 +188,5 @@ async def get_current_admin(current_user: User = Depends(get_current_user)) -> U
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Доступ запрещен: только администраторы"
         )
-    # Возвращаем объект текущего пользователя
+    # Возвращаем текущего пользователя
     return current_user
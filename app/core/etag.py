@@ -0,0 +1,64 @@
+# ETag для ресурсов пользователя на основе версии записи
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+
+def make_etag(user_id: int, version: int) -> str:
+    """
+    Формирует строгий ETag пользователя из его id и версии записи.
+
+    :param user_id: id пользователя
+    :param version: Версия записи пользователя
+    :return: ETag в кавычках, готовый для заголовка ответа
+    """
+    return f'"{user_id}.{version}"'
+
+
+def parse_if_match(if_match: Optional[str], user_id: int) -> Optional[int]:
+    """
+    Извлекает ожидаемую версию записи из заголовка If-Match.
+
+    :param if_match: Значение заголовка If-Match
+    :param user_id: id пользователя, которого обновляют
+    :return: Ожидаемая версия или None, если проверка версии не требуется
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        # Слабые ETag не подходят для условного обновления
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Для If-Match требуется строгий ETag",
+        )
+    try:
+        etag_user_id, version = value.strip('"').split(".")
+        if int(etag_user_id) != user_id:
+            raise ValueError("ETag относится к другому пользователю")
+        return int(version)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Версия пользователя не совпадает с If-Match",
+        )
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Проверяет, совпадает ли ETag ресурса с одним из перечисленных в заголовке If-None-Match.
+    Для If-None-Match используется слабое сравнение, поэтому префикс W/ не учитывается.
+
+    :param if_none_match: Значение заголовка If-None-Match
+    :param etag: Текущий ETag ресурса
+    :return: True, если клиент уже имеет актуальную версию ресурса
+    """
+    if if_none_match is None:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in ("*", etag):
+            return True
+    return False
@@ -0,0 +1,249 @@
+# Хеширование и проверка паролей (bcrypt) в ограниченном пуле воркеров
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.core.metrics import password_hash_duration
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def get_pwd_context():
+    """
+    Возвращает общий контекст для хеширования паролей.
+    passlib и bcrypt загружаются при первом обращении, а не при запуске приложения
+    """
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+@functools.lru_cache(maxsize=None)
+def _bcrypt_handler(rounds: Optional[int]):
+    """
+    Возвращает обработчик bcrypt с заданной стоимостью (None - стоимость по умолчанию)
+    """
+    handler = get_pwd_context().handler("bcrypt")
+    return handler.using(rounds=rounds) if rounds is not None else handler
+
+
+def _hash_password(password: str, rounds: Optional[int] = None) -> str:
+    """
+    Хеширует пароль (выполняется внутри воркера пула)
+    """
+    return _bcrypt_handler(rounds).hash(password)
+
+
+def get_hash_rounds(password_hash: str) -> Optional[int]:
+    """
+    Возвращает стоимость (rounds) из хеша bcrypt вида $2b$12$..., или None для другого формата
+    """
+    parts = password_hash.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def _verify_password(password: str, password_hash: str) -> bool:
+    """
+    Проверяет пароль по хешу (выполняется внутри воркера пула)
+    """
+    return get_pwd_context().verify(password, password_hash)
+
+
+class PasswordHasher:
+    """
+    Пул воркеров для bcrypt, который не блокирует event loop.
+
+    Количество одновременно ожидающих задач ограничено max_queue:
+    при переполнении запрос отклоняется с кодом 503, а не копится в очереди.
+    Стоимость bcrypt задается rounds или подбирается методом calibrate.
+    """
+
+    def __init__(
+            self,
+            executor_type: str = "thread",
+            workers: int = 4,
+            max_queue: int = 64,
+            rounds: Optional[int] = None,
+    ):
+        if executor_type not in ("thread", "process"):
+            raise ValueError(f"Неизвестный тип пула для хеширования паролей: {executor_type}")
+        self.executor_type = executor_type
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self.calibrated_seconds: Optional[float] = None
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+        self._operations: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def executor(self) -> Executor:
+        """
+        Возвращает пул воркеров, создавая его при первом обращении
+        """
+        with self._lock:
+            if self._executor is None:
+                if self.executor_type == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="password-hasher"
+                    )
+            return self._executor
+
+    async def hash(self, password: str) -> str:
+        """
+        Асинхронно хеширует пароль в пуле
+        """
+        return await self._run("hash", _hash_password, password, self.rounds)
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        """
+        Хеширует пароли параллельно, не занимая больше воркеров, чем есть в пуле
+        """
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def hash_one(password: str) -> str:
+            async with semaphore:
+                return await self.hash(password)
+
+        return list(await asyncio.gather(*(hash_one(password) for password in passwords)))
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        """
+        Асинхронно проверяет пароль в пуле
+        """
+        return await self._run("verify", _verify_password, password, password_hash)
+
+    @property
+    def target_rounds(self) -> int:
+        """
+        Стоимость bcrypt, с которой хешируются новые пароли
+        """
+        return self.rounds if self.rounds is not None else _bcrypt_handler(None).default_rounds
+
+    @property
+    def pending(self) -> int:
+        """
+        Количество выполняемых и ожидающих операций в пуле
+        """
+        return self._pending
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """
+        Проверяет, ниже ли стоимость хеша целевой. Более стойкие хеши не пересчитываются,
+        чтобы снижение стоимости (например, после подбора на более медленной реплике) не ослабляло их
+        """
+        rounds = get_hash_rounds(password_hash)
+        return rounds is not None and rounds < self.target_rounds
+
+    def calibrate(self, target_seconds: float, min_rounds: int, max_rounds: int) -> int:
+        """
+        Подбирает максимальную стоимость bcrypt в диапазоне [min_rounds, max_rounds],
+        при которой хеширование одного пароля на текущем оборудовании укладывается в target_seconds.
+        Время bcrypt удваивается с каждым rounds, поэтому достаточно замерить минимальную стоимость
+        """
+        handler = _bcrypt_handler(min_rounds)
+        # Лучший из нескольких замеров, чтобы не учитывать прогрев и случайные задержки
+        elapsed = float("inf")
+        for _ in range(3):
+            started = time.perf_counter()
+            handler.hash("calibration-password")
+            elapsed = min(elapsed, time.perf_counter() - started)
+        rounds = min_rounds
+        while rounds < max_rounds and elapsed * 2 <= target_seconds:
+            rounds += 1
+            elapsed *= 2
+        self.rounds = rounds
+        self.calibrated_seconds = elapsed
+        logger.info(
+            f"Стоимость bcrypt: {rounds} rounds, ожидаемое время хеширования {elapsed * 1000:.1f} мс "
+            f"при бюджете {target_seconds * 1000:.0f} мс"
+        )
+        return rounds
+
+    async def _run(self, operation: str, func: Callable[..., Any], *args: Any) -> Any:
+        self._acquire(operation)
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self._release(operation, time.perf_counter() - started)
+
+    def _acquire(self, operation: str) -> None:
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self._rejected += 1
+                rejected = True
+            else:
+                self._pending += 1
+                rejected = False
+        if rejected:
+            logger.warning(f"Очередь хеширования паролей переполнена, операция {operation} отклонена")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервис перегружен, повторите попытку позже",
+            )
+
+    def _release(self, operation: str, elapsed: float) -> None:
+        password_hash_duration.observe(elapsed, operation=operation)
+        with self._lock:
+            self._pending -= 1
+            stats = self._operations.setdefault(
+                operation, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            stats["count"] += 1
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    def stats(self) -> dict:
+        """
+        Возвращает состояние очереди и метрики времени выполнения операций
+        """
+        with self._lock:
+            return {
+                "executor": self.executor_type,
+                "workers": self.workers,
+                "rounds": self.target_rounds,
+                "calibrated_seconds": self.calibrated_seconds,
+                "max_queue": self.max_queue,
+                "pending": self._pending,
+                "rejected": self._rejected,
+                "operations": {
+                    operation: {
+                        **values,
+                        "avg_seconds": values["total_seconds"] / values["count"] if values["count"] else 0.0,
+                    }
+                    for operation, values in self._operations.items()
+                },
+            }
+
+    def shutdown(self) -> None:
+        """
+        Останавливает пул воркеров
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher(
+    executor_type=settings.password_hash_executor,
+    workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue,
+    rounds=settings.password_hash_rounds,
+)
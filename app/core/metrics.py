@@ -0,0 +1,225 @@
+# Метрики приложения: гистограммы задержек и экспорт в текстовом формате Prometheus
+import bisect
+import functools
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Стандартные границы корзин гистограмм Prometheus (в секундах)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+# Операции SQL, которые учитываются отдельно; остальные попадают в other
+SQL_OPERATIONS = ("select", "insert", "update", "delete", "with")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    """
+    Гистограмма с набором меток, совместимая с форматом Prometheus
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # метки -> (количество по корзинам, сумма, общее количество)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Записывает одно наблюдение с указанными метками
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._series.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            if index < len(counts):
+                counts[index] += 1
+            self._series[key] = (counts, total + value, count + 1)
+
+    def samples(self) -> Dict[Tuple[str, ...], Tuple[List[int], float, int]]:
+        """
+        Возвращает копию накопленных данных по всем наборам меток
+        """
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+
+    def render(self) -> List[str]:
+        """
+        Формирует строки гистограммы в текстовом формате Prometheus
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self.samples().items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key))
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{_format_value(bound)}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Длительность обработки HTTP-запросов по шаблону маршрута и коду ответа",
+    ("method", "route", "status"),
+)
+db_query_duration = Histogram(
+    "db_query_duration_seconds",
+    "Длительность запросов к базе данных по типу операции",
+    ("operation",),
+)
+password_hash_duration = Histogram(
+    "password_hash_duration_seconds",
+    "Длительность хеширования и проверки паролей, включая ожидание в очереди пула",
+    ("operation",),
+)
+
+REGISTRY: Tuple[Histogram, ...] = (http_request_duration, db_query_duration, password_hash_duration)
+
+
+def render_metrics() -> str:
+    """
+    Возвращает все метрики в текстовом формате Prometheus
+    """
+    lines: List[str] = []
+    for histogram in REGISTRY:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware, измеряющая длительность HTTP-запросов.
+
+    Запросы группируются по шаблону маршрута (например, /private/users/{pk}),
+    а не по фактическому пути, чтобы количество рядов метрик не росло вместе с id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "<unmatched>"),
+                status=str(status_code),
+            )
+
+
+def _sql_operation(query: str) -> str:
+    operation = query.lstrip().split(" ", 1)[0].lower()
+    return operation if operation in SQL_OPERATIONS else "other"
+
+
+def _timed(method):
+    @functools.wraps(method)
+    async def wrapper(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await method(self, query, *args, **kwargs)
+        finally:
+            db_query_duration.observe(time.perf_counter() - started, operation=_sql_operation(query))
+
+    wrapper._instrumented = True
+    return wrapper
+
+
+class InstrumentedPool:
+    """
+    Обертка пула соединений, которая считает задачи, ожидающие соединение (waiters).
+    Остальные атрибуты и методы передаются пулу без изменений
+    """
+
+    def __init__(self, pool: Any):
+        self.pool = pool
+        self.waiters = 0
+
+    async def acquire(self, *args: Any, **kwargs: Any) -> Any:
+        self.waiters += 1
+        try:
+            return await self.pool.acquire(*args, **kwargs)
+        finally:
+            self.waiters -= 1
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.pool, name)
+
+
+# Пулы соединений по имени подключения Tortoise
+_pools: Dict[str, InstrumentedPool] = {}
+
+
+def get_instrumented_pool(connection_name: str) -> Optional[InstrumentedPool]:
+    """
+    Возвращает пул подключения, созданный после instrument_connection, или None, если пула нет
+    """
+    return _pools.get(connection_name)
+
+
+def _counted_pool(method):
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        pool = InstrumentedPool(await method(self, *args, **kwargs))
+        _pools[self.connection_name] = pool
+        return pool
+
+    wrapper._instrumented = True
+    return wrapper
+
+
+def instrument_connection(connection) -> None:
+    """
+    Оборачивает методы выполнения запросов в классе подключения Tortoise и в классе его транзакций
+    (TransactionWrapper того же модуля), чтобы измерялись и запросы внутри in_transaction().
+    Пул соединений, если подключение его создает, оборачивается для подсчета ожидающих соединение
+    """
+    client_class = type(connection)
+    create_pool = getattr(client_class, "create_pool", None)
+    if create_pool is not None and not getattr(create_pool, "_instrumented", False):
+        client_class.create_pool = _counted_pool(create_pool)
+    transaction_class = getattr(sys.modules[client_class.__module__], "TransactionWrapper", None)
+    for method_name in ("execute_query", "execute_query_dict", "execute_insert", "execute_many"):
+        method = getattr(client_class, method_name)
+        if not getattr(method, "_instrumented", False):
+            setattr(client_class, method_name, _timed(method))
+        # Транзакция наследует методы подключения, отдельно оборачиваются только ее собственные
+        override = vars(transaction_class).get(method_name) if transaction_class is not None else None
+        if override is not None and not getattr(override, "_instrumented", False):
+            setattr(transaction_class, method_name, _timed(override))
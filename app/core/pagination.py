@@ -0,0 +1,88 @@
+# Кодирование курсоров для keyset-пагинации
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Кодирует id последней записи страницы в непрозрачный курсор.
+
+    :param last_id: id последней записи на странице
+    :return: Курсор в виде строки, безопасной для URL
+    """
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Декодирует курсор, полученный от клиента.
+
+    :param cursor: Курсор из параметра запроса after
+    :return: id последней записи предыдущей страницы
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        last_id = payload["id"]
+        if not isinstance(last_id, int):
+            raise ValueError("id должен быть целым числом")
+        return last_id
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации",
+        )
+
+
+# Позиция в ленте изменений: время изменения и id последней выданной записи
+ChangesPosition = Optional[Tuple[datetime, int]]
+
+
+def encode_changes_cursor(users: ChangesPosition, tombstones: ChangesPosition) -> str:
+    """
+    Кодирует позиции ленты изменений (измененные пользователи и отметки об удалении) в курсор.
+
+    :param users: (updated_at, id) последнего выданного пользователя или None
+    :param tombstones: (deleted_at, id) последней выданной отметки об удалении или None
+    :return: Курсор в виде строки, безопасной для URL
+    """
+    payload = {
+        name: [position[0].isoformat(), position[1]] if position is not None else None
+        for name, position in (("u", users), ("d", tombstones))
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_changes_cursor(cursor: str) -> Tuple[ChangesPosition, ChangesPosition]:
+    """
+    Декодирует курсор ленты изменений, полученный от клиента.
+
+    :param cursor: Курсор из параметра запроса since
+    :return: Позиции для пользователей и для отметок об удалении
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        positions = []
+        for name in ("u", "d"):
+            position = payload[name]
+            if position is None:
+                positions.append(None)
+                continue
+            changed_at, last_id = position
+            if not isinstance(last_id, int):
+                raise ValueError("id должен быть целым числом")
+            positions.append((datetime.fromisoformat(changed_at), last_id))
+        return positions[0], positions[1]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор ленты изменений",
+        )
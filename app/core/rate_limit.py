@@ -0,0 +1,221 @@
+# Ограничение частоты попыток входа (алгоритм token bucket)
+import ipaddress
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple, Union
+
+from fastapi import HTTPException, Request, status
+
+from app.core.config import settings
+from app.db.models import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitStore(ABC):
+    """
+    Хранилище корзин токенов. Реализация должна атомарно пополнять корзину и списывать токен
+    """
+
+    @abstractmethod
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> float:
+        """
+        Списывает один токен из корзины key.
+
+        :return: 0, если токен списан, иначе количество секунд до появления следующего токена
+        """
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """
+        Удаляет все корзины
+        """
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """
+    Корзины в памяти процесса. Каждый воркер ограничивает частоту независимо от остальных
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self._buckets.move_to_end(key)
+                return (1 - tokens) / refill_per_second
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+            # Вытесняем давно не использованные корзины; они почти наверняка уже полные
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return 0.0
+
+    async def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class DatabaseRateLimitStore(RateLimitStore):
+    """
+    Корзины в таблице базы данных, общие для всех воркеров.
+    Пополнение и списание выполняются одним INSERT ... ON CONFLICT DO UPDATE
+    """
+
+    # Как часто (в вызовах take для одного вида ключей) удалять корзины, которые уже успели наполниться
+    CLEANUP_EVERY = 1000
+
+    def __init__(self):
+        self._calls: Dict[str, int] = {}
+
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> float:
+        db = RateLimitBucket._meta.db
+        table = RateLimitBucket._meta.db_table
+        postgres = db.capabilities.dialect == "postgres"
+        least = "LEAST" if postgres else "MIN"
+        refilled = f'{least}($2, "{table}".tokens + ($3 - "{table}".updated_at) * $4)'
+        query = (
+            f'INSERT INTO "{table}" (key, tokens, updated_at) VALUES ($1, $5, $3) '
+            f"ON CONFLICT (key) DO UPDATE SET tokens = {refilled} - 1, updated_at = $3 "
+            f"WHERE {refilled} >= 1 "
+            "RETURNING tokens"
+        )
+        if not postgres:
+            # SQLite поддерживает нумерованные параметры вида ?1
+            query = query.replace("$", "?")
+        now = time.time()
+        # Вид ключа - префикс до двоеточия (ip:, email:). У каждого вида свои емкость и скорость пополнения,
+        # поэтому очистка удаляет только корзины того же вида, что и текущий ключ
+        scope = "".join(key.partition(":")[:2])
+        calls = self._calls[scope] = self._calls.get(scope, 0) + 1
+        if calls % self.CLEANUP_EVERY == 0:
+            await RateLimitBucket.filter(
+                key__startswith=scope, updated_at__lt=now - capacity / refill_per_second
+            ).delete()
+        values = [key, float(capacity), now, float(refill_per_second), float(capacity) - 1]
+        if await db.execute_query_dict(query, values):
+            return 0.0
+        # Условие WHERE не выполнено: токенов нет, корзина не изменилась
+        bucket = await RateLimitBucket.get_or_none(key=key)
+        if bucket is None:
+            return 0.0
+        tokens = min(capacity, bucket.tokens + (now - bucket.updated_at) * refill_per_second)
+        return max(0.0, (1 - tokens) / refill_per_second)
+
+    async def clear(self) -> None:
+        await RateLimitBucket.all().delete()
+
+
+def create_rate_limit_store(kind: str) -> RateLimitStore:
+    """
+    Создает хранилище корзин по имени из настроек (memory или database)
+    """
+    if kind == "memory":
+        return MemoryRateLimitStore()
+    if kind == "database":
+        return DatabaseRateLimitStore()
+    raise ValueError(f"Неизвестное хранилище для ограничения частоты входа: {kind}")
+
+
+@lru_cache(maxsize=8)
+def _trusted_networks(proxies: Tuple[str, ...]) -> Tuple[Union[ipaddress.IPv4Network, ipaddress.IPv6Network], ...]:
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in proxies)
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address.strip())
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_networks(tuple(settings.trusted_proxies)))
+
+
+def get_client_ip(request: Request) -> Optional[str]:
+    """
+    Определяет адрес клиента для ограничения частоты.
+    Если запрос пришел от доверенного прокси (settings.trusted_proxies), адрес берется из X-Forwarded-For:
+    это самый правый адрес цепочки, не принадлежащий доверенным прокси. Остальные значения заголовка
+    клиент может подделать, поэтому они не учитываются
+    """
+    client_ip = request.client.host if request.client else None
+    if not client_ip or not settings.trusted_proxies or not _is_trusted_proxy(client_ip):
+        return client_ip
+    forwarded = request.headers.get("x-forwarded-for")
+    if not forwarded:
+        return client_ip
+    for address in reversed(forwarded.split(",")):
+        address = address.strip()
+        if address and not _is_trusted_proxy(address):
+            return address
+    return client_ip
+
+
+class LoginRateLimiter:
+    """
+    Ограничитель попыток входа по адресу клиента и по email.
+    Проверяется до обращения к bcrypt, поэтому отклоненная попытка почти ничего не стоит
+    """
+
+    def __init__(self, store: RateLimitStore):
+        self.store = store
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"allowed": 0, "rejected_ip": 0, "rejected_email": 0}
+
+    async def check(self, email: str, client_ip: Optional[str]) -> None:
+        """
+        Списывает по токену из корзин адреса клиента и email.
+        Если токенов нет, выбрасывает HTTPException с кодом 429 и заголовком Retry-After
+        """
+        if not settings.login_rate_limit_enabled:
+            return
+        limits = []
+        if client_ip:
+            limits.append((
+                "ip", f"ip:{client_ip}",
+                settings.login_rate_limit_ip_capacity, settings.login_rate_limit_ip_per_minute,
+            ))
+        limits.append((
+            "email", f"email:{email.lower()}",
+            settings.login_rate_limit_email_capacity, settings.login_rate_limit_email_per_minute,
+        ))
+        for scope, key, capacity, per_minute in limits:
+            retry_after = await self.store.take(key, capacity, per_minute / 60)
+            if retry_after > 0:
+                self._count(f"rejected_{scope}")
+                logger.warning(f"Превышена частота попыток входа для {key}")
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Слишком много попыток входа, повторите позже",
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+        self._count("allowed")
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self) -> dict:
+        """
+        Возвращает тип хранилища и счетчики разрешенных и отклоненных попыток
+        """
+        with self._lock:
+            return {
+                "store": type(self.store).__name__,
+                "enabled": settings.login_rate_limit_enabled,
+                **self._counters,
+            }
+
+
+login_rate_limiter = LoginRateLimiter(create_rate_limit_store(settings.login_rate_limit_store))
@@ -0,0 +1,44 @@
+# Быстрая сериализация ответов со списками: строки из базы данных сразу кодируются в JSON,
+# без повторной валидации pydantic-моделями
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - запасной путь, если orjson не установлен
+    orjson = None
+
+# Кодировщик, которым фактически сериализуются ответы
+JSON_ENCODER = "orjson" if orjson is not None else "json"
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Объект типа {type(value).__name__} не сериализуется в JSON")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Кодирует данные в JSON (UTF-8). Использует orjson, если он установлен
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON-ответ, который кодирует содержимое как есть.
+    Возврат такого ответа из эндпоинта минует валидацию response_model,
+    поэтому используется только для данных, уже приведенных к нужной форме
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,52 @@
+# Замер длительности фаз запуска приложения
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """
+    Длительность фаз запуска приложения в порядке их выполнения
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Сохраняет длительность фазы, измеренную вне таймера
+        """
+        self.phases[name] = seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Измеряет длительность фазы, выполняемой внутри блока with
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def log(self) -> None:
+        """
+        Пишет в журнал общее время запуска и длительность каждой фазы
+        """
+        phases = ", ".join(f"{name} {seconds * 1000:.1f} мс" for name, seconds in self.phases.items())
+        logger.info(f"Приложение запущено за {sum(self.phases.values()) * 1000:.1f} мс: {phases}")
+
+    def stats(self) -> dict:
+        """
+        Возвращает длительность фаз запуска в миллисекундах
+        """
+        return {
+            "total_ms": round(sum(self.phases.values()) * 1000, 1),
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()},
+        }
+
+
+startup_timer = StartupTimer()
@@ -1,49 +1,165 @@
-from tortoise import Tortoise
+import logging
+from pathlib import Path
+from typing import Optional, Union
+from urllib.parse import urlsplit, urlunsplit
+
+from tortoise import Tortoise, connections
+from tortoise.backends.base.config_generator import expand_db_url
+from tortoise.exceptions import OperationalError
 
 from app.core.config import settings
+from app.core.metrics import get_instrumented_pool, instrument_connection
 
+logger = logging.getLogger(__name__)
 
-TORTOISE_ORM = {
-    "connections": {"default": settings.database_url},
-    "apps": {
-        "models": {
-            "models": ["app.db.models", "aerich.models"],
-            "default_connection": "default",
-        },
-    },
-}
-
-def get_tortoise_config(test: bool = False):
-    if test:
-        return {
-            "connections": {"default": settings.test_database_url},
-            "apps": {
-                "models": {
-                    "models": ["app.db.models", "aerich.models"],
-                    "default_connection": "default",
-                },
-            },
-        }
-    else:
-        return {
-            "connections": {"default": settings.database_url},
-            "apps": {
-                "models": {
-                    "models": ["app.db.models", "aerich.models"],
-                    "default_connection": "default",
-                },
+# Приложение Tortoise, миграции которого отслеживает aerich
+MODELS_APP = "models"
+
+# Миграция с триггерами PostgreSQL, которые ставят время изменения и удаления пользователя по часам базы данных
+CHANGE_CLOCK_MIGRATION = "2_20261018180000_update.sql"
+
+
+def mask_db_url(db_url: str) -> str:
+    """
+    Скрывает пароль в URL подключения к базе данных для записи в журнал
+    """
+    parts = urlsplit(str(db_url))
+    if parts.password is None:
+        return str(db_url)
+    netloc = parts.netloc.replace(f":{parts.password}@", ":***@", 1)
+    return urlunsplit(parts._replace(netloc=netloc))
+
+
+def get_connection_config(db_url: str) -> Union[str, dict]:
+    """
+    Формирует настройки подключения с параметрами пула соединений из настроек приложения.
+    Для СУБД, отличных от PostgreSQL, возвращает URL без изменений
+    """
+    db_url = str(db_url)
+    if db_url.startswith("postgresql://"):
+        db_url = "postgres://" + db_url[len("postgresql://"):]
+    if not db_url.startswith(("postgres://", "asyncpg://")):
+        return db_url
+    config = expand_db_url(db_url)
+    config["credentials"].update({
+        "minsize": settings.db_pool_min_size,
+        "maxsize": settings.db_pool_max_size,
+        "statement_cache_size": settings.db_statement_cache_size,
+        "command_timeout": settings.db_command_timeout,
+        "max_queries": settings.db_max_queries,
+        "max_inactive_connection_lifetime": settings.db_max_inactive_connection_lifetime,
+        # Порог оператора <% для нечеткого поиска по ФИО (расширение pg_trgm)
+        "server_settings": {"pg_trgm.word_similarity_threshold": str(settings.search_similarity_threshold)},
+    })
+    return config
+
+
+def get_tortoise_config(test: bool = False, with_aerich: bool = True):
+    """
+    Формирует конфигурацию Tortoise ORM.
+    Модель aerich нужна только для миграций и генерации схемы, без нее пакет aerich не импортируется
+    """
+    db_url = settings.test_database_url if test else settings.database_url
+    models = ["app.db.models", "aerich.models"] if with_aerich else ["app.db.models"]
+    return {
+        "connections": {"default": get_connection_config(db_url)},
+        "apps": {
+            MODELS_APP: {
+                "models": models,
+                "default_connection": "default",
             },
-        }
+        },
+    }
+
+
+TORTOISE_ORM = get_tortoise_config()
 
 
 async def init_db(test: bool = False):
     """
-    Инициализирует подключение к базе данных и создает таблицы при необходимости.
+    Инициализирует подключение к базе данных и подготавливает схему
+    """
+    await connect_db(test)
+    await prepare_schema(test)
+
+
+async def connect_db(test: bool = False):
+    """
+    Инициализирует подключение к базе данных.
+    В режиме check модель aerich не загружается: таблица миграций читается прямым запросом
+    """
+    db_url = settings.test_database_url if test else settings.database_url
+    logger.info(f"Подключение к базе данных: {mask_db_url(db_url)}")
+    with_aerich = test or settings.db_schema_mode == "generate"
+    await Tortoise.init(config=get_tortoise_config(test, with_aerich=with_aerich))
+    instrument_connection(connections.get("default"))
+
+
+async def prepare_schema(test: bool = False):
+    """
+    Создает таблицы (режим generate, а также в тестах) или только проверяет,
+    что к базе данных применена последняя миграция (режим check)
+    """
+    if test or settings.db_schema_mode == "generate":
+        await Tortoise.generate_schemas()
+        await create_change_clock_triggers()
+    else:
+        await check_schema_version()
+
+
+async def create_change_clock_triggers() -> None:
     """
-    config = get_tortoise_config(test)
-    print(f"Инициализация Tortoise ORM with config: {config['connections']['default']}")
-    await Tortoise.init(config=get_tortoise_config(test))
-    await Tortoise.generate_schemas()
+    Создает в PostgreSQL триггеры из миграции CHANGE_CLOCK_MIGRATION: updated_at пользователя и deleted_at
+    отметки об удалении берутся из часов базы данных (время начала транзакции), а не из часов приложения.
+    generate_schemas не создает триггеры, поэтому в режиме generate они применяются отдельно
+    """
+    connection = connections.get("default")
+    if connection.capabilities.dialect != "postgres":
+        return
+    # aerich импортируется только здесь: в режиме check он не нужен
+    from aerich.utils import get_version_content_from_file
+
+    migration = get_version_content_from_file(Path(settings.db_migrations_dir) / CHANGE_CLOCK_MIGRATION)
+    for statement in migration["upgrade"]:
+        await connection.execute_script(statement)
+
+
+def get_latest_migration(migrations_dir: str) -> Optional[str]:
+    """
+    Возвращает имя последнего файла миграции aerich (вида 3_20240101120000_update.sql)
+    или None, если каталога миграций нет
+    """
+    path = Path(migrations_dir)
+    if not path.is_dir():
+        return None
+    versions = [file.name for file in path.glob("*.sql") if file.name.split("_", 1)[0].isdigit()]
+    if not versions:
+        return None
+    return max(versions, key=lambda name: int(name.split("_", 1)[0]))
+
+
+async def check_schema_version() -> str:
+    """
+    Проверяет одним запросом к таблице aerich, что схема базы данных соответствует миграциям приложения.
+    Если каталога миграций нет, достаточно того, что миграции применялись.
+    Возвращает примененную версию, иначе выбрасывает RuntimeError
+    """
+    try:
+        rows = await connections.get("default").execute_query_dict(
+            f"SELECT version FROM aerich WHERE app = '{MODELS_APP}' ORDER BY id DESC LIMIT 1"
+        )
+    except OperationalError as exc:
+        raise RuntimeError(f"Не удалось прочитать версию схемы базы данных: {exc}") from exc
+    if not rows:
+        raise RuntimeError("Миграции не применены к базе данных, выполните aerich upgrade")
+    applied = rows[0]["version"]
+    expected = get_latest_migration(settings.db_migrations_dir)
+    if expected is not None and applied != expected:
+        raise RuntimeError(
+            f"Схема базы данных устарела: применена миграция {applied}, ожидается {expected}. "
+            "Выполните aerich upgrade"
+        )
+    return applied
 
 
 async def close_db():
@@ -51,3 +167,27 @@ async def close_db():
     Закрывает все подключения к базе данных.
     """
     await Tortoise.close_connections()
+
+
+def get_pool_stats() -> dict:
+    """
+    Возвращает состояние пула соединений: размер, занятые и свободные соединения
+    и количество запросов, ожидающих свободное соединение
+    """
+    connection = connections.get("default")
+    pool = get_instrumented_pool(connection.connection_name)
+    if pool is None:
+        # Пул не создан (например, SQLite в тестах)
+        return {"engine": connection.capabilities.dialect, "pool": False}
+    size = pool.get_size()
+    idle = pool.get_idle_size()
+    return {
+        "engine": connection.capabilities.dialect,
+        "pool": True,
+        "min_size": pool.get_min_size(),
+        "max_size": pool.get_max_size(),
+        "size": size,
+        "in_use": size - idle,
+        "idle": idle,
+        "waiters": pool.waiters,
+    }
@@ -1,27 +1,73 @@
 # Описание моделей базы данных
+import re
+from typing import Optional
+
 from tortoise import fields
 from tortoise.models import Model
 
 
+def build_search_key(first_name: Optional[str], last_name: Optional[str], other_name: Optional[str]) -> str:
+    """
+    Формирует нормализованный ключ для поиска по ФИО: нижний регистр, ё -> е, только буквы и цифры
+    """
+    text = " ".join(part for part in (first_name, last_name, other_name) if part)
+    return " ".join(re.findall(r"\w+", text.lower().replace("ё", "е")))
+
+
 class User(Model):
     """
     Модель пользователя для системы
     """
     id = fields.IntField(pk=True,help_text="уникальный номер пользователя")
     first_name = fields.CharField(max_length=50,help_text="имя пользоваля")
-    last_name = fields.CharField(max_length=50,help_text="фамилия пользователя")
+    last_name = fields.CharField(max_length=50, index=True, help_text="фамилия пользователя")
     other_name = fields.CharField(max_length=50, null=True,help_text="отчество пользователя")
     email = fields.CharField(max_length=255, unique=True,help_text="электронная почта")
     phone = fields.CharField(max_length=20, null=True,help_text="номер телефона")
-    birthday = fields.DateField(null=True,help_text="дата рождения")
+    birthday = fields.DateField(null=True, index=True, help_text="дата рождения")
     is_admin = fields.BooleanField(default=False, help_text="флаг на админа")
     password_hash = fields.CharField(max_length=128, help_text="хэш пароля")
     city = fields.IntField(null=True,help_text="номер региона")
     additional_info = fields.TextField(null=True,help_text="дополнительная ифнормация")
+    version = fields.IntField(default=1, help_text="версия записи для оптимистичной блокировки")
+    token_version = fields.IntField(default=1, help_text="версия токенов доступа, увеличивается при их отзыве")
+    created_at = fields.DatetimeField(auto_now_add=True, help_text="время создания записи")
+    updated_at = fields.DatetimeField(auto_now=True, help_text="время последнего изменения записи")
+    search_key = fields.CharField(max_length=160, null=True, help_text="нормализованное ФИО для поиска")
 
     class Meta:
         table = "users"
         app = "models"
+        # Составные индексы для фильтров администратора с сортировкой/курсором по id
+        # и для ленты изменений с курсором по (updated_at, id)
+        indexes = (("city", "id"), ("is_admin", "id"), ("updated_at", "id"))
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
+
+
+class UserTombstone(Model):
+    """
+    Отметка об удалении пользователя для ленты изменений
+    """
+    id = fields.BigIntField(pk=True, help_text="уникальный номер отметки")
+    user_id = fields.IntField(help_text="номер удаленного пользователя")
+    deleted_at = fields.DatetimeField(auto_now_add=True, help_text="время удаления пользователя")
+
+    class Meta:
+        table = "user_tombstones"
+        app = "models"
+        indexes = (("deleted_at", "id"),)
+
+
+class RateLimitBucket(Model):
+    """
+    Корзина токенов ограничителя частоты запросов, общая для всех процессов приложения
+    """
+    key = fields.CharField(max_length=255, pk=True, help_text="ключ ограничения, например email:<адрес>")
+    tokens = fields.FloatField(help_text="оставшееся количество токенов")
+    updated_at = fields.FloatField(help_text="время последнего списания (unix time)")
+
+    class Meta:
+        table = "rate_limit_buckets"
+        app = "models"
@@ -0,0 +1,84 @@
+"""
+Подготовка базы данных к нечеткому поиску пользователей по ФИО.
+
+Aerich не умеет описывать расширения и индексы с классом операторов,
+поэтому триграммный GIN-индекс создается отдельной командой после миграций:
+    python -m app.db.search_index
+Команда идемпотентна и заполняет ключ поиска у записей, где он еще не вычислен.
+"""
+import asyncio
+
+from tortoise import Tortoise
+
+from app.db.database import close_db, get_tortoise_config
+from app.db.models import User, build_search_key
+
+SEARCH_INDEX_NAME = "idx_users_search_key_trgm"
+
+# Количество записей, обрабатываемых за один запрос при заполнении ключа поиска вне PostgreSQL
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def search_key_sql(first_name: str = "first_name", last_name: str = "last_name", other_name: str = "other_name") -> str:
+    """
+    Возвращает SQL-выражение PostgreSQL, которое вычисляет ключ поиска так же, как build_search_key.
+    Аргументы - SQL-выражения частей ФИО (по умолчанию столбцы таблицы users)
+    """
+    return (
+        f"btrim(regexp_replace(replace(lower(concat_ws(' ', {first_name}, {last_name}, {other_name})), "
+        "'ё', 'е'), '\\W+', ' ', 'g'))"
+    )
+
+
+async def backfill_search_keys() -> int:
+    """
+    Вычисляет ключ поиска для записей, у которых он не заполнен.
+    Возвращает количество обновленных записей
+    """
+    db = User._meta.db
+    if db.capabilities.dialect == "postgres":
+        # То же преобразование, что и build_search_key, одним UPDATE на стороне базы данных
+        _, updated = await db.execute_query(
+            f'UPDATE "{User._meta.db_table}" SET search_key = {search_key_sql()} WHERE search_key IS NULL'
+        )
+        return updated
+    updated = 0
+    last_id = 0
+    while True:
+        rows = await User.filter(search_key=None, id__gt=last_id).order_by("id").limit(
+            BACKFILL_CHUNK_SIZE
+        ).values_list("id", "first_name", "last_name", "other_name")
+        if not rows:
+            return updated
+        for user_id, first_name, last_name, other_name in rows:
+            await User.filter(id=user_id).update(search_key=build_search_key(first_name, last_name, other_name))
+        updated += len(rows)
+        last_id = rows[-1][0]
+
+
+async def ensure_search_index() -> None:
+    """
+    Устанавливает pg_trgm, создает триграммный индекс по users.search_key и заполняет пустые ключи
+    """
+    db = User._meta.db
+    if db.capabilities.dialect == "postgres":
+        table = User._meta.db_table
+        await db.execute_script("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        await db.execute_script(
+            f'CREATE INDEX IF NOT EXISTS "{SEARCH_INDEX_NAME}" '
+            f'ON "{table}" USING gin (search_key gin_trgm_ops)'
+        )
+    updated = await backfill_search_keys()
+    print(f"Индекс поиска по ФИО готов, заполнено ключей поиска: {updated}")
+
+
+async def main() -> None:
+    await Tortoise.init(config=get_tortoise_config())
+    try:
+        await ensure_search_index()
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
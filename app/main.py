@@ -1,15 +1,23 @@
+import asyncio
 import logging
-import os
+import time
 from contextlib import asynccontextmanager
 
+# Начало импорта фреймворков и модулей приложения, для журнала фаз запуска
+IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from jose import JWTError
 from tortoise.exceptions import DoesNotExist
 
-from app.db.database import init_db, close_db
-from app.routers import user_router, admin_router
+from app.core.config import settings
+from app.core.hashing import password_hasher
+from app.core.metrics import MetricsMiddleware
+from app.core.startup import startup_timer
+from app.db.database import close_db, connect_db, prepare_schema
+from app.routers import user_router, admin_router, diagnostics_router, metrics_router
 
 app = FastAPI(
     title="Сервис для хранения данных о пользователях",
@@ -20,6 +28,9 @@ app = FastAPI(
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Сбор метрик длительности запросов по маршрутам
+app.add_middleware(MetricsMiddleware)
+
 
 # Обработчик ошибок для внутренних серверных ошибок
 @app.exception_handler(Exception)
@@ -81,24 +92,44 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             "code": exc.status_code,
             "message": exc.detail
         },
+        headers=exc.headers,
     )
 
 
 # Подключение роутеров
 app.include_router(user_router.router, prefix="/users", tags=["users"])
 app.include_router(admin_router.router, prefix="/private/users", tags=["admin"])
+app.include_router(diagnostics_router.router, prefix="/private/diagnostics", tags=["diagnostics"])
+app.include_router(metrics_router.router, tags=["metrics"])
+
+
+# Время импорта заканчивается после подключения роутеров
+startup_timer.record("imports", time.perf_counter() - IMPORT_STARTED)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    logging.info("Приложение запущено")
-    test_mode = os.getenv('TESTING') == '1'
-    await init_db()
+    # Подбор стоимости bcrypt под бюджет времени на текущем оборудовании
+    if settings.password_hash_rounds is None and settings.password_hash_target_ms > 0:
+        with startup_timer.phase("bcrypt_calibration"):
+            await asyncio.to_thread(
+                password_hasher.calibrate,
+                settings.password_hash_target_ms / 1000,
+                settings.password_hash_min_rounds,
+                settings.password_hash_max_rounds,
+            )
+    with startup_timer.phase("db_connect"):
+        await connect_db()
     try:
+        # Если схема не прошла проверку, подключения к базе данных закрываются в finally
+        with startup_timer.phase(f"db_schema_{settings.db_schema_mode}"):
+            await prepare_schema()
+        startup_timer.log()
         yield
     finally:
         logging.info("Приложение завершило работу")
         await close_db()
+        password_hasher.shutdown()
 
 
 app.router.lifespan_context = lifespan
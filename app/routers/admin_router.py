@@ -1,35 +1,93 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 
 from app.core.auth import get_current_admin
+from app.core.config import settings
+from app.core.etag import etag_matches, make_etag, parse_if_match
+from app.core.pagination import decode_changes_cursor, decode_cursor, encode_changes_cursor, encode_cursor
+from app.core.serialization import FastJSONResponse
 from app.schemas.user_schema import (
     PrivateUserResponse,
     PrivateCreateUser,
     PrivateUpdateUser,
     UsersListResponseModel,
+    ImportReportResponse,
+    UserSearchResponse,
+    USERS_LIST_FIELDS,
+    PRIVATE_USER_FIELDS,
+    UserBatchGetRequest,
+    UserBatchGetResponse,
+    UserBulkUpdateRequest,
+    UserBulkUpdateResponse,
+    UserBulkDeleteRequest,
+    UserBulkDeleteResponse,
+    UserChangesResponse,
 )
+from app.services.user_bulk_service import UserBulkService
+from app.services.user_changes_service import UserChangesService
+from app.services.user_export_service import UserExportService
+from app.services.user_import_service import UserImportService
+from app.services.user_search_service import UserSearchService
 from app.services.user_service import UserService
 
 router = APIRouter(tags=["admin"])
 
 
-# Эндпоинт для получения списка пользователей с пагинацией
+# Параметры фильтрации списка пользователей для администратора
+def user_filters(
+        city: Optional[int] = None,
+        is_admin: Optional[bool] = None,
+        last_name: Optional[str] = Query(None, min_length=1, max_length=50, description="Префикс фамилии"),
+        birthday_from: Optional[date] = None,
+        birthday_to: Optional[date] = None,
+) -> dict:
+    return UserService.build_user_filters(
+        city=city,
+        is_admin=is_admin,
+        last_name=last_name,
+        birthday_from=birthday_from,
+        birthday_to=birthday_to,
+    )
+
+
+# Эндпоинт для получения списка пользователей с пагинацией и фильтрами.
+# Без параметра page используется курсорная пагинация по id (параметр after)
 @router.get("", response_model=UsersListResponseModel)
 async def get_users(
-        page: int,
-        size: int,
+        size: int = Query(..., ge=1),
+        page: Optional[int] = Query(None, ge=1),
+        after: Optional[str] = None,
+        filters: dict = Depends(user_filters),
         current_user=Depends(get_current_admin)
 ):
-    users, total = await UserService.get_users(page=page, size=size)
-    return {
+    if page is not None and after is None:
+        total, count_strategy = await UserService.count_users(filters)
+        users = await UserService.get_users(page=page, size=size, filters=filters, fields=USERS_LIST_FIELDS)
+        pagination = {"total": total, "page": page, "size": size}
+    else:
+        # Общее количество возвращается только на первой странице: следующие страницы по курсору
+        # не выполняют COUNT по всей таблице
+        total, count_strategy = await UserService.count_users(filters) if after is None else (None, None)
+        after_id = decode_cursor(after) if after else None
+        users, next_id = await UserService.get_users_after(
+            after_id=after_id, size=size, filters=filters, fields=USERS_LIST_FIELDS
+        )
+        pagination = {
+            "total": total,
+            "size": size,
+            "after": encode_cursor(next_id) if next_id is not None else None
+        }
+    pagination["count_strategy"] = count_strategy
+    # Строки из базы данных кодируются в JSON напрямую, без валидации через UsersListResponseModel
+    return FastJSONResponse({
         "data": users,
         "meta": {
-            "pagination": {
-                "total": total,
-                "page": page,
-                "size": size
-            }
+            "pagination": pagination
         }
-    }
+    })
 
 
 # Эндпоинт для создания пользователя
@@ -38,38 +96,150 @@ async def create_user(
     user_data: PrivateCreateUser,
     current_user=Depends(get_current_admin)
 ):
-    existing_user = await UserService.get_user_by_email(user_data.email)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Пользователь с таким email уже существует"
-        )
     user = await UserService.create_user_service(user_data)
     return user
 
 
+# Эндпоинт для массового импорта пользователей из NDJSON или CSV.
+# Тело запроса читается потоком, формат определяется параметром format или Content-Type.
+# Отчет содержит счетчики и только ошибочные строки (не больше import_max_reported_errors)
+@router.post("/import", response_model=ImportReportResponse)
+async def import_users(
+        request: Request,
+        format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+        batch_size: Optional[int] = Query(None, ge=1, le=settings.bulk_import_max_batch_size),
+        current_user=Depends(get_current_admin)
+):
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if content_type.startswith("text/csv") else "ndjson"
+    if format == "csv":
+        rows = UserImportService.iter_csv_rows(request.stream())
+    else:
+        rows = UserImportService.iter_ndjson_rows(request.stream())
+    return await UserImportService.import_users(rows, batch_size=batch_size)
+
+
+# Эндпоинт для потоковой выгрузки пользователей в NDJSON или CSV.
+# Поля выбираются параметром fields (через запятую) из полей PrivateUserResponse
+@router.get("/export")
+async def export_users(
+        format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+        fields: Optional[str] = None,
+        current_user=Depends(get_current_admin)
+):
+    selected_fields = UserExportService.parse_fields(fields)
+    if format == "csv":
+        content = UserExportService.export_csv(selected_fields)
+        media_type = "text/csv"
+    else:
+        content = UserExportService.export_ndjson(selected_fields)
+        media_type = "application/x-ndjson"
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'}
+    )
+
+
+# Эндпоинт для получения нескольких пользователей по списку id одним запросом.
+# Пользователи возвращаются в порядке запроса, отсутствующие id перечисляются в missing
+@router.post("/batch-get", response_model=UserBatchGetResponse)
+async def batch_get_users(
+        request_data: UserBatchGetRequest,
+        current_user=Depends(get_current_admin)
+):
+    users, missing = await UserService.get_users_by_ids(request_data.ids, PRIVATE_USER_FIELDS)
+    return FastJSONResponse({"data": users, "missing": missing})
+
+
+# Эндпоинт для массового обновления пользователей в одной транзакции:
+# список изменений по id (items) или одно изменение для всех пользователей по фильтру (filter и patch)
+@router.post("/bulk-update", response_model=UserBulkUpdateResponse)
+async def bulk_update_users(
+        request_data: UserBulkUpdateRequest,
+        current_user=Depends(get_current_admin)
+):
+    return await UserBulkService.update_users(request_data)
+
+
+# Эндпоинт для массового удаления пользователей по списку id или по фильтру.
+# С dry_run возвращает количество пользователей, которые были бы удалены
+@router.post("/bulk-delete", response_model=UserBulkDeleteResponse)
+async def bulk_delete_users(
+        request_data: UserBulkDeleteRequest,
+        current_user=Depends(get_current_admin)
+):
+    return await UserBulkService.delete_users(request_data)
+
+
+# Эндпоинт для нечеткого поиска пользователей по части ФИО, в том числе с опечатками
+@router.get("/search", response_model=UserSearchResponse)
+async def search_users(
+        q: str = Query(..., min_length=2, max_length=100, description="Часть ФИО"),
+        limit: int = Query(20, ge=1, le=settings.search_max_limit),
+        current_user=Depends(get_current_admin)
+):
+    return {"data": await UserSearchService.search(q, limit)}
+
+
+# Эндпоинт ленты изменений для инкрементальной синхронизации: пользователи, созданные или измененные
+# после курсора since, и отметки об их удалении. Без since лента начинается с начала.
+# Курсор next из ответа передается в следующий запрос, в том числе когда изменений нет
+@router.get("/changes", response_model=UserChangesResponse)
+async def get_user_changes(
+        since: Optional[str] = None,
+        limit: int = Query(100, ge=1, le=settings.changes_max_limit),
+        current_user=Depends(get_current_admin)
+):
+    users_position, tombstones_position = decode_changes_cursor(since) if since else (None, None)
+    data, users_position, tombstones_position, has_more = await UserChangesService.get_changes(
+        users_position, tombstones_position, limit
+    )
+    return FastJSONResponse({
+        "data": data,
+        "next": encode_changes_cursor(users_position, tombstones_position),
+        "has_more": has_more,
+    })
+
+
 # Эндпоинт для получения информации о пользователе по ID
 @router.get("/{pk}", response_model=PrivateUserResponse)
 async def get_user(
         pk: int,
+        response: Response,
+        if_none_match: Optional[str] = Header(None),
         current_user=Depends(get_current_admin)
 ):
+    # Условный запрос решается по версии записи, без загрузки и сериализации пользователя
+    if if_none_match is not None:
+        version = await UserService.get_user_version(pk)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Пользователь не найден")
+        etag = make_etag(pk, version)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
     user = await UserService.get_user_by_id(pk)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
+    response.headers["ETag"] = make_etag(user.id, user.version)
     return user
 
 
-# Эндпоинт для обновления информации о пользователе
+# Эндпоинт для обновления информации о пользователе.
+# С заголовком If-Match обновление применяется только к указанной версии записи
 @router.patch("/{pk}", response_model=PrivateUserResponse)
 async def update_user(
         pk: int,
         user_data: PrivateUpdateUser,
+        response: Response,
+        if_match: Optional[str] = Header(None),
         current_user=Depends(get_current_admin)
 ):
-    updated_user = await UserService.update_user(pk, user_data)
+    updated_user = await UserService.update_user(pk, user_data, expected_version=parse_if_match(if_match, pk))
     if not updated_user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
+    response.headers["ETag"] = make_etag(updated_user.id, updated_user.version)
     return updated_user
 
 
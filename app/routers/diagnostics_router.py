@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends
+
+from app.core.auth import get_current_admin
+from app.core.hashing import password_hasher
+from app.core.rate_limit import login_rate_limiter
+from app.core.startup import startup_timer
+from app.db.database import get_pool_stats
+from app.services.user_service import principal_cache, token_versions
+
+router = APIRouter(tags=["diagnostics"])
+
+
+# Эндпоинт для получения диагностической информации о сервисе
+@router.get("")
+async def get_diagnostics(current_user=Depends(get_current_admin)):
+    return {
+        "db_pool": get_pool_stats(),
+        "password_hasher": password_hasher.stats(),
+        "principal_cache": principal_cache.stats(),
+        "token_versions": token_versions.stats(),
+        "login_rate_limiter": login_rate_limiter.stats(),
+        "startup": startup_timer.stats(),
+    }
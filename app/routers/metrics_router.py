@@ -0,0 +1,25 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.core.metrics import render_metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+# Эндпоинт для сбора метрик в текстовом формате Prometheus.
+# Если задан METRICS_TOKEN, запрос должен содержать заголовок Authorization: Bearer <токен>
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    if settings.metrics_token and not secrets.compare_digest(
+            authorization or "", f"Bearer {settings.metrics_token}"
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Для доступа к метрикам нужен токен",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,12 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from typing import Optional
 
-from app.core.auth import create_access_token, get_current_user
-from app.schemas.user_schema import UserResponse, CreateUser, UpdateUser, LoginModel, UsersListResponseModel
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status, Response
+
+from app.core.auth import create_access_token, get_current_principal, load_user_by_email
+from app.core.etag import etag_matches, make_etag, parse_if_match
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.rate_limit import get_client_ip, login_rate_limiter
+from app.core.serialization import FastJSONResponse
+from app.schemas.user_schema import (
+    UserResponse,
+    CreateUser,
+    UpdateUser,
+    LoginModel,
+    UsersListResponseModel,
+    USERS_LIST_FIELDS,
+)
 from app.services.user_service import UserService
 
 router = APIRouter()
 
 
+def set_access_token_cookie(response: Response, user) -> str:
+    """
+    Выпускает токен с claims пользователя и устанавливает его в cookie
+    """
+    access_token = create_access_token(data={"sub": user.email}, user=user)
+    response.set_cookie(
+        key="access_token",
+        value=access_token,
+        httponly=True,
+        samesite='lax'
+    )
+    return access_token
+
+
 # Эндпоинт для регистрации пользователя
 @router.post("/register", response_model=UserResponse)
 async def register_user(user: CreateUser):
@@ -15,21 +42,17 @@ async def register_user(user: CreateUser):
 
 # Эндпоинт для входа пользователя
 @router.post("/login")
-async def login_user(login_data: LoginModel, response: Response):
+async def login_user(login_data: LoginModel, request: Request, response: Response):
+    # Ограничение частоты проверяется до bcrypt, чтобы перебор паролей не занимал процессор
+    await login_rate_limiter.check(login_data.email, get_client_ip(request))
     user = await UserService.authenticate_user(login_data.email, login_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Неверные учетные данные"
         )
-    access_token = create_access_token(data={"sub": user.email})
     # Устанавливаем JWT-токен в cookie
-    response.set_cookie(
-        key="access_token",
-        value=access_token,
-        httponly=True,
-        samesite='lax'
-    )
+    access_token = set_access_token_cookie(response, user)
     return {
         "message": "Авторизация успешна",
         "access_token": access_token,
@@ -44,49 +67,78 @@ async def logout_user(response: Response):
     return {"message": "Вышел из системы успешно"}
 
 
-# Получение данных текущего пользователя
+# Получение данных текущего пользователя.
+# С заголовком If-None-Match и неизменившейся версией записи возвращается 304 без тела
 @router.get("/current", response_model=UserResponse)
-async def get_current_user_data(current_user=Depends(get_current_user)):
+async def get_current_user_data(
+        response: Response,
+        if_none_match: Optional[str] = Header(None),
+        principal=Depends(get_current_principal)
+):
+    if if_none_match is not None:
+        version = await UserService.get_user_version(principal.id)
+        if version is not None:
+            etag = make_etag(principal.id, version)
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    # Токен уже проверен зависимостью, запись загружается по email из него без повторного декодирования
+    current_user = await load_user_by_email(principal.email)
+    response.headers["ETag"] = make_etag(current_user.id, current_user.version)
     return current_user
 
 
-# Обновление данных текущего пользователя
+# Обновление данных текущего пользователя.
+# С заголовком If-Match обновление применяется только к указанной версии записи
 @router.patch("/current", response_model=UserResponse)
 async def update_current_user(
         user_data: UpdateUser,
-        current_user=Depends(get_current_user)
+        response: Response,
+        if_match: Optional[str] = Header(None),
+        current_user=Depends(get_current_principal)
 ):
-    updated_user = await UserService.update_user(current_user.id, user_data)
+    updated_user = await UserService.update_user(
+        current_user.id, user_data, expected_version=parse_if_match(if_match, current_user.id)
+    )
     if not updated_user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
+    # Смена email отзывает выданные токены, поэтому выдаем новый
+    if "email" in user_data.__fields_set__:
+        set_access_token_cookie(response, updated_user)
+    response.headers["ETag"] = make_etag(updated_user.id, updated_user.version)
     return updated_user
 
 
-# Получение списка пользователей с пагинацией (для всех пользователей)
+# Получение списка пользователей с пагинацией (для всех пользователей).
+# Без параметра page используется курсорная пагинация по id (параметр after)
 @router.get("/users", response_model=UsersListResponseModel)
 async def get_users(
-        page: int,
-        size: int,
-        current_user=Depends(get_current_user)
+        size: int = Query(..., ge=1),
+        page: Optional[int] = Query(None, ge=1),
+        after: Optional[str] = None,
+        current_user=Depends(get_current_principal)
 ):
-    users, total = await UserService.get_users(page=page, size=size)
-    # Формируем список с ограниченной информацией
-    users_data = [
-        {
-            "id": user.id,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "email": user.email
+    if page is not None and after is None:
+        total, count_strategy = await UserService.count_users()
+        users = await UserService.get_users(page=page, size=size, fields=USERS_LIST_FIELDS)
+        pagination = {"total": total, "page": page, "size": size}
+    else:
+        # Общее количество возвращается только на первой странице: следующие страницы по курсору
+        # не выполняют COUNT по всей таблице
+        total, count_strategy = await UserService.count_users() if after is None else (None, None)
+        after_id = decode_cursor(after) if after else None
+        users, next_id = await UserService.get_users_after(
+            after_id=after_id, size=size, fields=USERS_LIST_FIELDS
+        )
+        pagination = {
+            "total": total,
+            "size": size,
+            "after": encode_cursor(next_id) if next_id is not None else None
         }
-        for user in users
-    ]
-    return {
-        "data": users_data,
+    pagination["count_strategy"] = count_strategy
+    # Из базы данных читаются только поля элемента списка, строки кодируются в JSON без повторной валидации
+    return FastJSONResponse({
+        "data": users,
         "meta": {
-            "pagination": {
-                "total": total,
-                "page": page,
-                "size": size
-            }
+            "pagination": pagination
         }
-    }
+    })
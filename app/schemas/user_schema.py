@@ -1,8 +1,10 @@
 from __future__ import annotations
-from datetime import date
+from datetime import date, datetime
 from typing import Optional, List, Any
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, conlist, constr, root_validator
+
+from app.core.config import settings
 
 
 # Модель для информации о пользователе
@@ -33,6 +35,27 @@ class CreateUser(BaseModel):
     city: Optional[int] = None
     additional_info: Optional[str] = None
 
+# Поля пользователя, которые не могут быть пустыми (NOT NULL в базе данных)
+NON_NULLABLE_FIELDS = ("first_name", "last_name", "email", "is_admin")
+
+
+def null_fields(values: dict) -> List[str]:
+    """
+    Возвращает поля изменения, которым передан null, хотя в базе данных они обязательны
+    """
+    return [field for field in NON_NULLABLE_FIELDS if field in values and values[field] is None]
+
+
+def reject_null_fields(cls, values):
+    """
+    Валидатор моделей изменения: до валидации values содержит только переданные поля,
+    поэтому null в обязательном поле отличается от отсутствия поля
+    """
+    if isinstance(values, dict) and null_fields(values):
+        raise ValueError(f"Поля {', '.join(null_fields(values))} не могут быть null")
+    return values
+
+
 # Модель для обновления пользователя
 class UpdateUser(BaseModel):
     first_name: Optional[str] = None
@@ -47,6 +70,8 @@ class UpdateUser(BaseModel):
     class Config:
         orm_mode = True
 
+    _check_not_null = root_validator(pre=True, allow_reuse=True)(reject_null_fields)
+
 # Модель для авторизации пользователя
 class LoginModel(BaseModel):
     email: EmailStr
@@ -73,11 +98,17 @@ class UsersListElementModel(BaseModel):
         orm_mode = True
 
 
+# Поля пользователя в элементе списка
+USERS_LIST_FIELDS = tuple(UsersListElementModel.__fields__)
+
+
 # Модель для метаданных пагинации
 class PaginatedMetaDataModel(BaseModel):
-    total: int
-    page: int
+    total: Optional[int] = None
+    page: Optional[int] = None
     size: int
+    after: Optional[str] = None
+    count_strategy: Optional[str] = None
 
 
 # Модель для ответа со списком пользователей
@@ -116,6 +147,8 @@ class PrivateUpdateUser(BaseModel):
     class Config:
         orm_mode = True
 
+    _check_not_null = root_validator(pre=True, allow_reuse=True)(reject_null_fields)
+
 
 # Модель для детального ответа о пользователе (администратор)
 class PrivateUserResponse(BaseModel):
@@ -134,6 +167,148 @@ class PrivateUserResponse(BaseModel):
         orm_mode = True
 
 
+# Поля пользователя в ответах для администратора
+PRIVATE_USER_FIELDS = tuple(PrivateUserResponse.__fields__)
+
+
+# Модель для одного изменения в ленте изменений (администратор):
+# upsert - пользователь создан или изменен, delete - пользователь удален (user отсутствует)
+class UserChange(BaseModel):
+    op: str
+    id: int
+    changed_at: datetime
+    user: Optional[PrivateUserResponse]
+
+
+# Модель для страницы ленты изменений с курсором для следующего запроса (администратор)
+class UserChangesResponse(BaseModel):
+    data: List[UserChange]
+    next: str
+    has_more: bool
+
+
+# Модель для запроса нескольких пользователей по списку id (администратор)
+class UserBatchGetRequest(BaseModel):
+    ids: conlist(int, min_items=1, max_items=settings.batch_get_max_ids)
+
+
+# Модель для ответа на запрос нескольких пользователей: найденные в порядке запроса и отсутствующие id
+class UserBatchGetResponse(BaseModel):
+    data: List[PrivateUserResponse]
+    missing: List[int]
+
+
+# Модель для условий отбора пользователей при массовых операциях (администратор)
+class UserBulkFilter(BaseModel):
+    city: Optional[int] = None
+    is_admin: Optional[bool] = None
+    last_name: Optional[constr(min_length=1, max_length=50)] = None
+    birthday_from: Optional[date] = None
+    birthday_to: Optional[date] = None
+
+
+# Модель для изменения одного пользователя в массовом обновлении (администратор)
+class UserBulkUpdateItem(BaseModel):
+    id: int
+    patch: PrivateUpdateUser
+
+
+# Модель для массового обновления: список изменений по id или фильтр с одним изменением (администратор)
+class UserBulkUpdateRequest(BaseModel):
+    items: Optional[conlist(UserBulkUpdateItem, min_items=1, max_items=settings.bulk_update_max_items)] = None
+    filter: Optional[UserBulkFilter] = None
+    patch: Optional[PrivateUpdateUser] = None
+
+    @root_validator(skip_on_failure=True)
+    def check_mode(cls, values):
+        items, filter_, patch = values.get("items"), values.get("filter"), values.get("patch")
+        if items is not None:
+            if filter_ is not None or patch is not None:
+                raise ValueError("Укажите либо items, либо filter и patch")
+            ids = [item.id for item in items]
+            if len(ids) != len(set(ids)):
+                raise ValueError("Каждый id может встречаться в items только один раз")
+            if any(not item.patch.__fields_set__ for item in items):
+                raise ValueError("Изменение пользователя не может быть пустым")
+            return values
+        if filter_ is None or patch is None:
+            raise ValueError("Укажите либо items, либо filter и patch")
+        if not filter_.dict(exclude_none=True):
+            raise ValueError("Фильтр должен содержать хотя бы одно условие")
+        if not patch.__fields_set__:
+            raise ValueError("Изменение пользователя не может быть пустым")
+        if "password" in patch.__fields_set__ or "email" in patch.__fields_set__:
+            raise ValueError("Пароль и email нельзя менять по фильтру")
+        return values
+
+
+# Модель для массового удаления по списку id или по фильтру (администратор).
+# В режиме dry_run пользователи только подсчитываются
+class UserBulkDeleteRequest(BaseModel):
+    ids: Optional[conlist(int, min_items=1, max_items=settings.bulk_update_max_items)] = None
+    filter: Optional[UserBulkFilter] = None
+    dry_run: bool = False
+
+    @root_validator(skip_on_failure=True)
+    def check_mode(cls, values):
+        ids, filter_ = values.get("ids"), values.get("filter")
+        if (ids is None) == (filter_ is None):
+            raise ValueError("Укажите либо ids, либо filter")
+        if filter_ is not None and not filter_.dict(exclude_none=True):
+            raise ValueError("Фильтр должен содержать хотя бы одно условие")
+        return values
+
+
+# Модель для ответа на массовое удаление пользователей (администратор)
+class UserBulkDeleteResponse(BaseModel):
+    deleted: int
+    dry_run: bool
+
+
+# Модель для результата массовой операции над одним пользователем (администратор)
+class UserBulkResult(BaseModel):
+    id: int
+    status: str
+
+
+# Модель для ответа на массовое обновление пользователей (администратор)
+class UserBulkUpdateResponse(BaseModel):
+    updated: int
+    results: List[UserBulkResult]
+
+
+# Модель для ошибки импорта одной строки (администратор).
+# Успешно импортированные строки в отчет не попадают, только в счетчик created
+class ImportRowResult(BaseModel):
+    line: int
+    status: str
+    detail: Optional[Any] = None
+
+
+# Модель для отчета о массовом импорте пользователей (администратор)
+class ImportReportResponse(BaseModel):
+    total: int
+    created: int
+    failed: int
+    errors: List[ImportRowResult]
+    errors_truncated: bool
+
+
+# Модель для найденного пользователя при нечетком поиске по ФИО (администратор)
+class UserSearchResult(BaseModel):
+    id: int
+    first_name: str
+    last_name: str
+    other_name: Optional[str]
+    email: EmailStr
+    score: float
+
+
+# Модель для результатов нечеткого поиска, отсортированных по убыванию схожести (администратор)
+class UserSearchResponse(BaseModel):
+    data: List[UserSearchResult]
+
+
 class ErrorResponseModel(BaseModel):
     code: int
     message: str
@@ -0,0 +1,217 @@
+from typing import Any, Dict, List, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from tortoise import timezone
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from app.core.config import settings
+from app.core.hashing import password_hasher
+from app.db.models import User, UserTombstone, build_search_key
+from app.schemas.user_schema import UserBulkDeleteRequest, UserBulkUpdateRequest
+from app.services.user_search_service import user_search_index
+from app.services.user_service import (
+    DUPLICATE_EMAIL_MESSAGE,
+    SEARCH_KEY_FIELDS,
+    TOKEN_REVOKING_FIELDS,
+    UserService,
+    is_duplicate_email,
+    principal_cache,
+    token_versions,
+    update_assignments_sql,
+    users_count_cache,
+)
+
+
+def chunked(ids: Sequence[int], size: int) -> List[Sequence[int]]:
+    """
+    Разбивает список id на части для запросов id IN (...) ограниченного размера
+    """
+    return [ids[index:index + size] for index in range(0, len(ids), size)]
+
+
+class UserBulkService:
+    """
+    Класс для массовых изменений пользователей администратором
+    """
+
+    @staticmethod
+    async def update_users(request: UserBulkUpdateRequest) -> dict:
+        """
+        Применяет изменения к пользователям в одной транзакции.
+        Одинаковые изменения объединяются в один UPDATE ... WHERE id IN (...) на каждую часть id.
+        Возвращает количество обновленных пользователей и результат по каждому id:
+        updated, unchanged (изменение пусто после отбрасывания password: null, запись не меняется) или not_found.
+        Изменение по фильтру отклоняется, если под него попадает больше bulk_update_max_matched пользователей
+        """
+        if request.items is not None:
+            requested_ids = [item.id for item in request.items]
+            patches = [item.patch.dict(exclude_unset=True) for item in request.items]
+        else:
+            requested_ids = []
+            patches = [request.patch.dict(exclude_unset=True)]
+
+        # Пароли хешируются до начала транзакции, чтобы не держать ее открытой во время bcrypt
+        with_password = [index for index, patch in enumerate(patches) if patch.get("password") is not None]
+        hashes = await password_hasher.hash_many([patches[index]["password"] for index in with_password])
+        for index, password_hash in zip(with_password, hashes):
+            patches[index]["password_hash"] = password_hash
+        for patch in patches:
+            patch.pop("password", None)
+
+        try:
+            async with in_transaction() as connection:
+                if request.items is not None:
+                    existing = set(await User.filter(id__in=requested_ids).using_db(connection)
+                                   .values_list("id", flat=True))
+                    groups: Dict[Tuple[Tuple[str, Any], ...], List[int]] = {}
+                    for user_id, patch in zip(requested_ids, patches):
+                        if user_id in existing and patch:
+                            groups.setdefault(tuple(sorted(patch.items())), []).append(user_id)
+                    changes = [(dict(key), ids) for key, ids in groups.items()]
+                else:
+                    filters = UserService.build_user_filters(**request.filter.dict())
+                    limit = settings.bulk_update_max_matched
+                    matched = await User.filter(**filters).using_db(connection).order_by("id") \
+                        .limit(limit + 1).values_list("id", flat=True)
+                    if len(matched) > limit:
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Под фильтр попадает больше {limit} пользователей, уточните условия",
+                        )
+                    requested_ids = list(matched)
+                    existing = set(requested_ids)
+                    changes = [(patches[0], requested_ids)] if patches[0] else []
+
+                search_keys: Dict[int, str] = {}
+                for patch, ids in changes:
+                    search_keys.update(await UserBulkService._apply_patch(connection, patch, ids))
+        except IntegrityError as exc:
+            if not is_duplicate_email(exc):
+                raise
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=DUPLICATE_EMAIL_MESSAGE)
+
+        updated = {user_id for _, ids in changes for user_id in ids}
+        # Сбрасываем кэши только после фиксации транзакции
+        if updated:
+            users_count_cache.clear()
+            principal_cache.discard_where(lambda email, user: user.id in updated)
+        for user_id in updated:
+            token_versions.discard(user_id)
+        for user_id, search_key in search_keys.items():
+            user_search_index.add(user_id, search_key)
+
+        return {
+            "updated": len(updated),
+            "results": [
+                {
+                    "id": user_id,
+                    "status": "updated" if user_id in updated else "unchanged" if user_id in existing else "not_found",
+                }
+                for user_id in requested_ids
+            ],
+        }
+
+    @staticmethod
+    async def delete_users(request: UserBulkDeleteRequest) -> dict:
+        """
+        Удаляет пользователей по списку id или по фильтру частями по bulk_chunk_size id.
+        Каждая часть удаляется отдельным запросом, чтобы не держать долгих блокировок.
+        В режиме dry_run только подсчитывает пользователей, которые были бы удалены
+        """
+        if request.ids is not None:
+            ids = list(dict.fromkeys(request.ids))
+            if request.dry_run:
+                total = 0
+                for chunk in chunked(ids, settings.bulk_chunk_size):
+                    total += await User.filter(id__in=chunk).count()
+                return {"deleted": total, "dry_run": True}
+            deleted = 0
+            for chunk in chunked(ids, settings.bulk_chunk_size):
+                deleted += await UserBulkService._delete_chunk(chunk)
+            return {"deleted": deleted, "dry_run": False}
+
+        filters = UserService.build_user_filters(**request.filter.dict())
+        if request.dry_run:
+            return {"deleted": await User.filter(**filters).count(), "dry_run": True}
+        deleted = 0
+        while True:
+            chunk = await User.filter(**filters).order_by("id").limit(settings.bulk_chunk_size) \
+                .values_list("id", flat=True)
+            if not chunk:
+                return {"deleted": deleted, "dry_run": False}
+            deleted += await UserBulkService._delete_chunk(chunk)
+
+    @staticmethod
+    async def _delete_chunk(ids: Sequence[int]) -> int:
+        """
+        Удаляет пользователей одним запросом, оставляет отметки об удалении для ленты изменений
+        и сбрасывает связанные с ними кэши
+        """
+        async with in_transaction() as connection:
+            removed = set(await User.filter(id__in=ids).using_db(connection).values_list("id", flat=True))
+            if not removed:
+                return 0
+            deleted = await User.filter(id__in=removed).using_db(connection).delete()
+            # bulk_create внутри in_transaction выполняется на соединении транзакции
+            await UserTombstone.bulk_create([UserTombstone(user_id=user_id) for user_id in sorted(removed)])
+        if deleted:
+            users_count_cache.clear()
+            principal_cache.discard_where(lambda email, user: user.id in removed)
+            for user_id in removed:
+                token_versions.set(user_id, 0)
+                user_search_index.remove(user_id)
+        return deleted
+
+    @staticmethod
+    async def _apply_patch(connection: BaseDBAsyncClient, patch: Dict[str, Any], ids: Sequence[int]) -> Dict[int, str]:
+        """
+        Применяет одно изменение к пользователям частями по bulk_chunk_size id.
+        Если меняется ФИО, возвращает новые ключи поиска по id: в PostgreSQL ключ пересчитывается
+        тем же UPDATE ... RETURNING, в остальных СУБД - отдельными запросами в той же транзакции
+        """
+        # В PostgreSQL триггер заменяет updated_at временем начала транзакции по часам базы данных
+        values = {**patch, "updated_at": timezone.now()}
+        increments = ["version"]
+        if patch.keys() & {*TOKEN_REVOKING_FIELDS, "password_hash"}:
+            increments.append("token_version")
+        renamed = bool(patch.keys() & SEARCH_KEY_FIELDS)
+        postgres = User._meta.db.capabilities.dialect == "postgres"
+
+        search_keys: Dict[int, str] = {}
+        for chunk in chunked(ids, settings.bulk_chunk_size):
+            if renamed and postgres:
+                assignments, params = update_assignments_sql(values, increments, refresh_search_key=True)
+                params.append(list(chunk))
+                rows = await connection.execute_query_dict(
+                    f'UPDATE "{User._meta.db_table}" SET {", ".join(assignments)} '
+                    f'WHERE "id" = ANY(${len(params)}) RETURNING "id", "search_key"',
+                    params,
+                )
+                search_keys.update((row["id"], row["search_key"]) for row in rows)
+                continue
+            await User.filter(id__in=chunk).using_db(connection).update(
+                **values, **{name: F(name) + 1 for name in increments}
+            )
+            if renamed:
+                search_keys.update(await UserBulkService._refresh_search_keys(connection, chunk))
+        return search_keys
+
+    @staticmethod
+    async def _refresh_search_keys(connection: BaseDBAsyncClient, ids: Sequence[int]) -> Dict[int, str]:
+        """
+        Пересчитывает ключи поиска по ФИО у переименованных пользователей (вне PostgreSQL).
+        Возвращает новые ключи по id
+        """
+        search_keys: Dict[int, str] = {}
+        rows = await User.filter(id__in=ids).using_db(connection).values_list(
+            "id", "first_name", "last_name", "other_name", "search_key"
+        )
+        for user_id, first_name, last_name, other_name, search_key in rows:
+            new_key = build_search_key(first_name, last_name, other_name)
+            if new_key != search_key:
+                await User.filter(id=user_id).using_db(connection).update(search_key=new_key)
+            search_keys[user_id] = new_key
+        return search_keys
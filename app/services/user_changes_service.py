@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from tortoise import timezone
+from tortoise.expressions import Q
+
+from app.core.config import settings
+from app.core.pagination import ChangesPosition
+from app.db.models import User, UserTombstone
+from app.schemas.user_schema import PRIVATE_USER_FIELDS
+
+
+def after_position(field: str, position: ChangesPosition) -> Q:
+    """
+    Условие (field, id) > position для keyset-пагинации.
+    Отдельное условие field >= ... задает границу диапазона для индекса (field, id)
+    """
+    changed_at, last_id = position
+    return Q(**{f"{field}__gte": changed_at}) & (Q(**{f"{field}__gt": changed_at}) | Q(id__gt=last_id))
+
+
+class UserChangesService:
+    """
+    Класс для ленты изменений пользователей, по которой внешние системы синхронизируются инкрементально
+    """
+
+    @staticmethod
+    async def changes_watermark() -> datetime:
+        """
+        Возвращает границу ленты: все изменения раньше нее уже зафиксированы.
+        В PostgreSQL время изменения ставят триггеры по началу транзакции (now()), поэтому граница -
+        начало самой старой открытой транзакции в базе данных (включая текущий запрос).
+        pg_stat_activity показывает время начала транзакций только сеансов той же роли, что и у приложения.
+        В остальных СУБД граница отстает от текущего времени на changes_settle_seconds
+        """
+        db = User._meta.db
+        if db.capabilities.dialect == "postgres":
+            rows = await db.execute_query_dict(
+                'SELECT min(xact_start) AS "until" FROM pg_stat_activity WHERE datname = current_database()'
+            )
+            return rows[0]["until"]
+        return timezone.now() - timedelta(seconds=settings.changes_settle_seconds)
+
+    @staticmethod
+    async def get_changes(
+            users_position: ChangesPosition,
+            tombstones_position: ChangesPosition,
+            limit: int
+    ) -> Tuple[List[dict], ChangesPosition, ChangesPosition, bool]:
+        """
+        Получает изменения после позиций курсора: измененных пользователей по индексу (updated_at, id)
+        и отметки об удалении по индексу (deleted_at, id), объединенные в порядке времени изменения.
+        Выдаются только изменения раньше границы changes_watermark, чтобы не пропустить записи
+        из транзакций, которые начались раньше, а зафиксировались позже.
+        Возвращает изменения, новые позиции курсора и признак того, что изменения еще остались
+        """
+        until = await UserChangesService.changes_watermark()
+
+        users_query = User.filter(updated_at__lt=until)
+        if users_position is not None:
+            users_query = users_query.filter(after_position("updated_at", users_position))
+        users = await users_query.order_by("updated_at", "id").limit(limit + 1) \
+            .values(*dict.fromkeys(("id", "updated_at", *PRIVATE_USER_FIELDS)))
+
+        tombstones_query = UserTombstone.filter(deleted_at__lt=until)
+        if tombstones_position is not None:
+            tombstones_query = tombstones_query.filter(after_position("deleted_at", tombstones_position))
+        tombstones = await tombstones_query.order_by("deleted_at", "id").limit(limit + 1) \
+            .values("id", "user_id", "deleted_at")
+
+        changes = [(row["updated_at"], 0, row["id"], row) for row in users]
+        changes.extend((row["deleted_at"], 1, row["id"], row) for row in tombstones)
+        changes.sort(key=lambda change: change[:3])
+
+        data = []
+        for changed_at, kind, position_id, row in changes[:limit]:
+            if kind == 0:
+                users_position = (changed_at, position_id)
+                data.append({
+                    "op": "upsert",
+                    "id": row["id"],
+                    "changed_at": changed_at,
+                    "user": {field: row[field] for field in PRIVATE_USER_FIELDS},
+                })
+            else:
+                tombstones_position = (changed_at, position_id)
+                data.append({"op": "delete", "id": row["user_id"], "changed_at": changed_at, "user": None})
+        return data, users_position, tombstones_position, len(changes) > limit
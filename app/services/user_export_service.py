@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, List, Optional
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.db.models import User
+from app.schemas.user_schema import PrivateUserResponse
+
+# Поля, доступные для выгрузки (совпадают с детальным ответом администратора)
+EXPORT_FIELDS: List[str] = list(PrivateUserResponse.__fields__)
+
+
+class UserExportService:
+    """
+    Класс для потоковой выгрузки пользователей в NDJSON/CSV
+    """
+
+    @staticmethod
+    def parse_fields(fields: Optional[str]) -> List[str]:
+        """
+        Разбирает список полей из параметра запроса (через запятую)
+        """
+        if not fields:
+            return EXPORT_FIELDS
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in selected if field not in EXPORT_FIELDS]
+        if unknown or not selected:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Недопустимые поля для выгрузки: {', '.join(unknown)}",
+            )
+        return selected
+
+    @staticmethod
+    async def iter_users(fields: List[str], chunk_size: Optional[int] = None) -> AsyncIterator[List[dict]]:
+        """
+        Постранично читает пользователей по возрастанию id (keyset), по chunk_size строк за запрос
+        """
+        chunk_size = chunk_size or settings.export_chunk_size
+        columns = fields if "id" in fields else ["id", *fields]
+        last_id = None
+        while True:
+            query = User.all()
+            if last_id is not None:
+                query = query.filter(id__gt=last_id)
+            rows = await query.order_by("id").limit(chunk_size).values(*columns)
+            if not rows:
+                return
+            last_id = rows[-1]["id"]
+            yield [{field: row[field] for field in fields} for row in rows]
+            if len(rows) < chunk_size:
+                return
+
+    @staticmethod
+    async def export_ndjson(fields: List[str], chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Выгружает пользователей в формате NDJSON
+        """
+        async for rows in UserExportService.iter_users(fields, chunk_size):
+            yield "".join(
+                json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows
+            ).encode("utf-8")
+
+    @staticmethod
+    async def export_csv(fields: List[str], chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Выгружает пользователей в формате CSV с заголовком
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        async for rows in UserExportService.iter_users(fields, chunk_size):
+            writer.writerows([row[field] for field in fields] for row in rows)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
@@ -0,0 +1,287 @@
+import csv
+import json
+import logging
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional, Tuple
+
+from pydantic import ValidationError
+from tortoise.exceptions import IntegrityError
+
+from app.core.config import settings
+from app.core.hashing import password_hasher
+from app.db.models import User, build_search_key
+from app.schemas.user_schema import PrivateCreateUser
+from app.services.user_search_service import user_search_index
+from app.services.user_service import DUPLICATE_EMAIL_MESSAGE, users_count_cache
+
+logger = logging.getLogger(__name__)
+
+# Строка входного файла: номер строки, данные строки и ошибка разбора
+ParsedRow = Tuple[int, Optional[dict], Optional[str]]
+
+ENCODING_ERROR_MESSAGE = "Некорректная кодировка строки, ожидается UTF-8"
+LINE_TOO_LONG_MESSAGE = "Строка длиннее допустимого размера"
+
+
+class _LineFeed:
+    """
+    Источник строк для csv.reader, который пополняется по мере чтения потока
+    """
+
+    def __init__(self):
+        self.lines: Deque[str] = deque()
+
+    def __iter__(self) -> "_LineFeed":
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+class _ImportReport:
+    """
+    Счетчики импорта и первые max_errors ошибок в порядке строк.
+    Ошибки разбора, найденные после начала пачки, ждут ее записи, чтобы не обогнать ее ошибки
+    """
+
+    def __init__(self, max_errors: int):
+        self.max_errors = max_errors
+        self.total = 0
+        self.created = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self._pending: List[dict] = []
+
+    def add_error(self, error: dict) -> None:
+        self.failed += 1
+        # Сохранять больше max_errors ожидающих ошибок бессмысленно: в отчет попадут только первые
+        if len(self._pending) < self.max_errors:
+            self._pending.append(error)
+
+    def add_batch(self, created: int, errors: List[dict]) -> None:
+        self.created += created
+        self.failed += len(errors)
+        merged = sorted(self._pending + errors, key=lambda error: error["line"])
+        self.errors.extend(merged[:self.max_errors - len(self.errors)])
+        self._pending = []
+
+    def result(self) -> dict:
+        self.add_batch(0, [])
+        return {
+            "total": self.total,
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+class UserImportService:
+    """
+    Класс для массового импорта пользователей из потока NDJSON/CSV
+    """
+
+    @staticmethod
+    async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[str], Optional[str]]]:
+        """
+        Построчно читает поток байтов, не загружая его целиком в память.
+        Перевод строки ищется только в новом фрагменте, поэтому чтение линейно по размеру потока.
+        Для строки, которая не декодируется как UTF-8 или длиннее import_max_line_bytes,
+        вместо текста возвращается ошибка; байты слишком длинной строки отбрасываются до перевода строки
+        """
+        max_line_bytes = settings.import_max_line_bytes
+        buffer = bytearray()
+        too_long = False
+        line_no = 0
+        async for chunk in stream:
+            start = 0
+            while True:
+                end = chunk.find(b"\n", start)
+                if end == -1:
+                    break
+                line_no += 1
+                if too_long or len(buffer) + end - start > max_line_bytes:
+                    yield line_no, None, LINE_TOO_LONG_MESSAGE
+                else:
+                    buffer += chunk[start:end]
+                    yield (line_no, *UserImportService._decode_line(bytes(buffer), line_no))
+                buffer.clear()
+                too_long = False
+                start = end + 1
+            if too_long:
+                continue
+            if len(buffer) + len(chunk) - start > max_line_bytes:
+                too_long = True
+                buffer.clear()
+            else:
+                buffer += chunk[start:]
+        if too_long:
+            yield line_no + 1, None, LINE_TOO_LONG_MESSAGE
+        elif buffer:
+            yield (line_no + 1, *UserImportService._decode_line(bytes(buffer), line_no + 1))
+
+    @staticmethod
+    def _decode_line(line: bytes, line_no: int) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            return line.decode("utf-8-sig" if line_no == 1 else "utf-8").rstrip("\r"), None
+        except UnicodeDecodeError:
+            return None, ENCODING_ERROR_MESSAGE
+
+    @staticmethod
+    async def iter_ndjson_rows(stream: AsyncIterator[bytes]) -> AsyncIterator[ParsedRow]:
+        """
+        Разбирает поток NDJSON: одна JSON-запись пользователя на строку
+        """
+        async for line_no, line, error in UserImportService.iter_lines(stream):
+            if error is not None:
+                yield line_no, None, error
+                continue
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                yield line_no, None, "Некорректный JSON"
+                continue
+            if not isinstance(data, dict):
+                yield line_no, None, "Ожидается JSON-объект"
+                continue
+            yield line_no, data, None
+
+    @staticmethod
+    async def iter_csv_rows(stream: AsyncIterator[bytes]) -> AsyncIterator[ParsedRow]:
+        """
+        Разбирает поток CSV: первая строка содержит названия полей.
+        Все строки проходят через один csv.reader, поэтому значения в кавычках могут содержать переводы строк.
+        Запись передается разборщику, только когда прочитаны все ее строки (кавычки закрыты)
+        """
+        feed = _LineFeed()
+        reader = csv.reader(feed)
+        header: Optional[List[str]] = None
+        record_line = 0
+        in_quotes = False
+        async for line_no, line, error in UserImportService.iter_lines(stream):
+            if error is not None:
+                # Незавершенная запись с некорректной строкой отбрасывается целиком
+                yield (record_line if in_quotes else line_no), None, error
+                feed.lines.clear()
+                in_quotes = False
+                continue
+            if not in_quotes:
+                if not line.strip():
+                    continue
+                record_line = line_no
+            feed.lines.append(line + "\n")
+            # Нечетное количество кавычек оставляет запись открытой до следующей строки
+            in_quotes ^= line.count('"') % 2 == 1
+            if in_quotes:
+                continue
+            try:
+                values = next(reader)
+            except csv.Error as exc:
+                yield record_line, None, f"Некорректная строка CSV: {exc}"
+                continue
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            if len(values) != len(header):
+                yield record_line, None, "Количество значений не совпадает с заголовком"
+                continue
+            # Пустые значения в CSV считаются отсутствующими
+            yield record_line, {name: value for name, value in zip(header, values) if value != ""}, None
+        if in_quotes:
+            yield record_line, None, "Незакрытые кавычки в конце файла"
+
+    @staticmethod
+    async def import_users(rows: AsyncIterator[ParsedRow], batch_size: Optional[int] = None) -> dict:
+        """
+        Валидирует строки, хеширует пароли параллельно и создает пользователей пачками.
+        Возвращает счетчики и ошибки в порядке строк (не больше import_max_reported_errors),
+        поэтому память не зависит от размера файла
+        """
+        batch_size = batch_size or settings.bulk_import_batch_size
+        report = _ImportReport(settings.import_max_reported_errors)
+        batch: List[Tuple[int, PrivateCreateUser]] = []
+
+        async for line_no, data, error in rows:
+            report.total += 1
+            if error is not None:
+                report.add_error({"line": line_no, "status": "error", "detail": error})
+                continue
+            try:
+                batch.append((line_no, PrivateCreateUser(**data)))
+            except ValidationError as exc:
+                report.add_error({"line": line_no, "status": "error", "detail": exc.errors()})
+                continue
+            if len(batch) >= batch_size:
+                report.add_batch(*await UserImportService._import_batch(batch))
+                batch = []
+        if batch:
+            report.add_batch(*await UserImportService._import_batch(batch))
+        return report.result()
+
+    @staticmethod
+    async def _import_batch(batch: List[Tuple[int, PrivateCreateUser]]) -> Tuple[int, List[dict]]:
+        """
+        Создает одну пачку пользователей через bulk_create.
+        Возвращает количество созданных пользователей и ошибки по строкам пачки
+        """
+        results: List[dict] = []
+        emails = [user_data.email for _, user_data in batch]
+        taken = set(await User.filter(email__in=emails).values_list("email", flat=True))
+
+        pending: List[Tuple[int, PrivateCreateUser]] = []
+        for line_no, user_data in batch:
+            if user_data.email in taken:
+                results.append({
+                    "line": line_no, "status": "error", "detail": DUPLICATE_EMAIL_MESSAGE
+                })
+                continue
+            # Повторы email внутри одной пачки тоже считаются конфликтом
+            taken.add(user_data.email)
+            pending.append((line_no, user_data))
+        if not pending:
+            return 0, results
+
+        password_hashes = await password_hasher.hash_many([user_data.password for _, user_data in pending])
+        users = [
+            User(
+                first_name=user_data.first_name,
+                last_name=user_data.last_name,
+                other_name=user_data.other_name,
+                email=user_data.email,
+                phone=user_data.phone,
+                birthday=user_data.birthday,
+                is_admin=user_data.is_admin,
+                password_hash=password_hash,
+                city=user_data.city,
+                additional_info=user_data.additional_info,
+                search_key=build_search_key(user_data.first_name, user_data.last_name, user_data.other_name),
+            )
+            for (_, user_data), password_hash in zip(pending, password_hashes)
+        ]
+
+        try:
+            await User.bulk_create(users)
+        except IntegrityError:
+            # Пачка могла столкнуться с параллельной вставкой: повторяем построчно
+            logger.warning("Конфликт при пакетной вставке пользователей, повтор по одному")
+            for (line_no, user_data), user in zip(pending, users):
+                try:
+                    await user.save()
+                except IntegrityError:
+                    results.append({"line": line_no, "status": "error", "detail": DUPLICATE_EMAIL_MESSAGE})
+        users_count_cache.clear()
+
+        failed_lines = {row["line"] for row in results}
+        ids = dict(await User.filter(
+            email__in=[user_data.email for _, user_data in pending]
+        ).values_list("email", "id"))
+        created = 0
+        for (line_no, user_data), user in zip(pending, users):
+            if line_no not in failed_lines:
+                user_search_index.add(ids.get(user_data.email), user.search_key)
+                created += 1
+        return created, results
@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.db.models import User, build_search_key
+
+# Поля пользователя, возвращаемые в результатах поиска
+SEARCH_RESULT_FIELDS = ("id", "first_name", "last_name", "other_name", "email")
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Разбивает текст на триграммы так же, как pg_trgm: каждое слово дополняется
+    двумя пробелами в начале и одним в конце
+    """
+    result: Set[str] = set()
+    for word in text.split():
+        padded = f"  {word} "
+        result.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return result
+
+
+class NgramIndex:
+    """
+    Внутрипроцессный триграммный индекс по ключам поиска пользователей.
+
+    Используется, когда в базе данных нет pg_trgm (SQLite в тестах и локальном режиме).
+    Строится при первом поиске и поддерживается при изменении пользователей только в этом процессе:
+    изменения, сделанные другими процессами приложения, попадают в индекс при его перестроении
+    не реже чем раз в search_index_rebuild_seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Set[int]] = {}
+        self._keys: Dict[int, Set[str]] = {}
+        self.built = False
+        self.built_at = 0.0
+
+    def add(self, user_id: int, search_key: Optional[str]) -> None:
+        """
+        Добавляет или заменяет ключ поиска пользователя (если индекс уже построен)
+        """
+        if not self.built:
+            return
+        with self._lock:
+            self._remove(user_id)
+            grams = trigrams(search_key or "")
+            self._keys[user_id] = grams
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(user_id)
+
+    def remove(self, user_id: int) -> None:
+        """
+        Удаляет пользователя из индекса
+        """
+        with self._lock:
+            self._remove(user_id)
+
+    def _remove(self, user_id: int) -> None:
+        for gram in self._keys.pop(user_id, ()):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(user_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def load(self, rows: List[Tuple[int, Optional[str]]]) -> None:
+        """
+        Заменяет содержимое индекса парами (id, ключ поиска) и помечает его построенным.
+        Новый индекс собирается отдельно, поиск во время перестроения идет по прежнему
+        """
+        postings: Dict[str, Set[int]] = {}
+        keys: Dict[int, Set[str]] = {}
+        for user_id, search_key in rows:
+            grams = trigrams(search_key or "")
+            keys[user_id] = grams
+            for gram in grams:
+                postings.setdefault(gram, set()).add(user_id)
+        with self._lock:
+            self._postings = postings
+            self._keys = keys
+            self.built = True
+            self.built_at = time.monotonic()
+
+    def is_stale(self, max_age: float) -> bool:
+        """
+        Проверяет, нужно ли построить индекс заново: он еще не построен или старше max_age секунд
+        (0 - перестраивать не нужно)
+        """
+        if not self.built:
+            return True
+        return max_age > 0 and time.monotonic() - self.built_at >= max_age
+
+    def search(self, query: str, limit: int, threshold: float) -> List[Tuple[int, float]]:
+        """
+        Возвращает пары (id, оценка), где оценка - доля триграмм запроса, найденных в ключе
+        (аналог word_similarity из pg_trgm)
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        matches: Counter = Counter()
+        with self._lock:
+            for gram in query_grams:
+                matches.update(self._postings.get(gram, ()))
+        scored = [
+            (user_id, count / len(query_grams))
+            for user_id, count in matches.items()
+            if count / len(query_grams) >= threshold
+        ]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._keys.clear()
+            self.built = False
+
+
+user_search_index = NgramIndex()
+
+
+class UserSearchService:
+    """
+    Класс для нечеткого поиска пользователей по ФИО
+    """
+
+    _use_trigram: Optional[bool] = None
+    _build_lock = asyncio.Lock()
+
+    @staticmethod
+    async def search(query: str, limit: int) -> List[dict]:
+        """
+        Ищет пользователей по части или ФИО с опечатками и возвращает их по убыванию схожести
+        """
+        normalized = build_search_key(query, None, None)
+        if not normalized:
+            return []
+        if await UserSearchService._trigram_available():
+            return await UserSearchService._search_trigram(normalized, limit)
+        return await UserSearchService._search_ngram_index(normalized, limit)
+
+    @staticmethod
+    async def _trigram_available() -> bool:
+        """
+        Проверяет (один раз на процесс), установлено ли расширение pg_trgm
+        """
+        if UserSearchService._use_trigram is None:
+            db = User._meta.db
+            available = False
+            if db.capabilities.dialect == "postgres":
+                rows = await db.execute_query_dict("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                available = bool(rows)
+            UserSearchService._use_trigram = available
+        return UserSearchService._use_trigram
+
+    @staticmethod
+    async def _search_trigram(query: str, limit: int) -> List[dict]:
+        """
+        Поиск в PostgreSQL по GIN-индексу с триграммами (оператор <%, word_similarity)
+        """
+        columns = ", ".join(f'"{field}"' for field in SEARCH_RESULT_FIELDS)
+        return await User._meta.db.execute_query_dict(
+            f"SELECT {columns}, word_similarity($1, search_key) AS score "
+            f'FROM "{User._meta.db_table}" '
+            "WHERE $1 <% search_key "
+            "ORDER BY score DESC, id LIMIT $2",
+            [query, limit],
+        )
+
+    @staticmethod
+    async def _search_ngram_index(query: str, limit: int) -> List[dict]:
+        """
+        Поиск по внутрипроцессному триграммному индексу
+        """
+        max_age = settings.search_index_rebuild_seconds
+        if user_search_index.is_stale(max_age):
+            async with UserSearchService._build_lock:
+                if user_search_index.is_stale(max_age):
+                    rows = await User.all().values_list("id", "search_key")
+                    user_search_index.load(rows)
+        scored = user_search_index.search(query, limit, settings.search_similarity_threshold)
+        if not scored:
+            return []
+        users = {
+            row["id"]: row
+            for row in await User.filter(id__in=[user_id for user_id, _ in scored]).values(*SEARCH_RESULT_FIELDS)
+        }
+        return [
+            {**users[user_id], "score": score}
+            for user_id, score in scored
+            if user_id in users
+        ]
@@ -1,44 +1,122 @@
+import asyncio
+import json
 import logging
-from typing import Optional, List, Tuple
+from datetime import date
+from typing import Any, Dict, Optional, List, Sequence, Set, Tuple, Union
 
-from fastapi import HTTPException, Request
-from jose import JWTError, jwt
-from passlib.hash import bcrypt
-from tortoise.exceptions import DoesNotExist
+from fastapi import HTTPException, Request, status
+from tortoise.exceptions import DoesNotExist, IntegrityError
+from tortoise import timezone
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
 
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.db.models import User
+from app.core.hashing import password_hasher
+from app.db.models import User, UserTombstone, build_search_key
+from app.db.search_index import search_key_sql
 from app.schemas.user_schema import CreateUser, UpdateUser
+from app.services.user_search_service import user_search_index
 
 logger = logging.getLogger(__name__)
 
+DUPLICATE_EMAIL_MESSAGE = "Пользователь с таким email уже существует"
+
+# Поля, из которых строится ключ поиска по ФИО
+SEARCH_KEY_FIELDS = ("first_name", "last_name", "other_name")
+
+# Поля, изменение которых отзывает выданные пользователю токены
+TOKEN_REVOKING_FIELDS = ("email", "password", "is_admin")
+
+# Поля, по которым фильтруется список пользователей: их изменение сбрасывает кэш количества
+COUNT_FILTER_FIELDS = ("city", "is_admin", "last_name", "birthday")
+
+# Кэш количества пользователей (по набору фильтров) для стратегии подсчета cached
+users_count_cache = TTLCache(maxsize=256, ttl=settings.users_count_cache_ttl)
+
+# Кэш аутентифицированных пользователей: email -> User
+principal_cache = TTLCache(maxsize=settings.principal_cache_size, ttl=settings.principal_cache_ttl)
+
+# Кэш версий токенов: id пользователя -> token_version (0 - пользователь не существует)
+token_versions = TTLCache(maxsize=settings.token_version_cache_size, ttl=settings.token_version_cache_ttl)
+
+
+def is_duplicate_email(exc: IntegrityError) -> bool:
+    """
+    Проверяет, что ошибка вызвана нарушением уникальности email, а не другим ограничением.
+    asyncpg сообщает имя ограничения (users_email_key), SQLite - столбец (users.email)
+    """
+    cause = exc.args[0] if exc.args else None
+    constraint = getattr(cause, "constraint_name", None)
+    if constraint is not None:
+        return constraint == f"{User._meta.db_table}_email_key"
+    message = str(exc).lower()
+    return "unique" in message and f"{User._meta.db_table}.email" in message
+
+
+def update_assignments_sql(
+        values: Dict[str, Any], increments: Sequence[str], refresh_search_key: bool = False
+) -> Tuple[List[str], List[Any]]:
+    """
+    Строит присваивания SET для UPDATE в PostgreSQL и их параметры ($1, $2, ...).
+    increments - счетчики, которые увеличиваются на 1, refresh_search_key - пересчитать ключ поиска по ФИО.
+    SET вычисляется по старым значениям столбцов, поэтому измененные части ФИО берутся из параметров
+    """
+    params = list(values.values())
+    assignments = [f'"{name}" = ${index}' for index, name in enumerate(values, 1)]
+    assignments.extend(f'"{name}" = "{name}" + 1' for name in increments)
+    if refresh_search_key:
+        parts = {
+            name: f"${list(values).index(name) + 1}::text" if name in values else f'"{name}"'
+            for name in SEARCH_KEY_FIELDS
+        }
+        assignments.append(f'"search_key" = {search_key_sql(**parts)}')
+    return assignments, params
+
 
 class UserService:
     """
     Класс для управления пользователями
     """
 
+    # Фоновые задачи перехеширования паролей (ссылки хранятся, чтобы задачи не были собраны GC)
+    _rehash_tasks: Set[asyncio.Task] = set()
+
     @staticmethod
     async def create_user_service(user_data: CreateUser) -> User:
         """
-        Создает нового пользователя на основе переданных данных
+        Создает нового пользователя на основе переданных данных.
+        Если email уже занят, выбрасывает HTTPException с кодом 400
         """
+        # Пользователь с этим email уже известен из кэша: не тратим время на хеширование
+        if principal_cache.contains(user_data.email):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=DUPLICATE_EMAIL_MESSAGE)
+
         # Хеширование пароля
-        hashed_password = bcrypt.hash(user_data.password)
-
-        # Создание записи пользователя в базе данных
-        user = await User.create(
-            first_name=user_data.first_name,
-            last_name=user_data.last_name,
-            other_name=user_data.other_name,
-            email=user_data.email,
-            phone=user_data.phone,
-            birthday=user_data.birthday,
-            is_admin=user_data.is_admin,
-            password_hash=hashed_password,
-            city=user_data.city,
-            additional_info=user_data.additional_info
-        )
+        hashed_password = await password_hasher.hash(user_data.password)
+
+        # Создание записи пользователя в базе данных одним INSERT,
+        # занятость email проверяется ограничением уникальности
+        try:
+            user = await User.create(
+                first_name=user_data.first_name,
+                last_name=user_data.last_name,
+                other_name=user_data.other_name,
+                email=user_data.email,
+                phone=user_data.phone,
+                birthday=user_data.birthday,
+                is_admin=user_data.is_admin,
+                password_hash=hashed_password,
+                city=user_data.city,
+                additional_info=user_data.additional_info,
+                search_key=build_search_key(user_data.first_name, user_data.last_name, user_data.other_name),
+            )
+        except IntegrityError as exc:
+            if not is_duplicate_email(exc):
+                raise
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=DUPLICATE_EMAIL_MESSAGE)
+        users_count_cache.clear()
+        user_search_index.add(user.id, user.search_key)
         return user
 
     @staticmethod
@@ -52,30 +130,138 @@ class UserService:
             return None
 
     @staticmethod
-    async def update_user(user_id: int, user_data: UpdateUser) -> Optional[User]:
+    async def update_user(
+            user_id: int,
+            user_data: UpdateUser,
+            expected_version: Optional[int] = None
+    ) -> Optional[User]:
         """
-        Обновляет данные пользователя на основе переданных данных
+        Обновляет только переданные поля пользователя одним запросом.
+        Если указана expected_version, обновление выполняется только для этой версии записи
         """
-        user = await UserService.get_user_by_id(user_id)
-        if user:
-            # Обновление полей, если они предоставлены
-            update_data = user_data.dict(exclude_unset=True)
-            for field, value in update_data.items():
-                setattr(user, field, value)
-            await user.save()
-            return user
-        return None
+        update_data = user_data.dict(exclude_unset=True)
+        # password: null не меняет пароль и поэтому не отзывает токены
+        if update_data.get("password", "") is None:
+            del update_data["password"]
+        revoke_tokens = bool(update_data.keys() & TOKEN_REVOKING_FIELDS)
+        if "password" in update_data:
+            update_data["password_hash"] = await password_hasher.hash(update_data.pop("password"))
+        filters = {"id": user_id}
+        if expected_version is not None:
+            filters["version"] = expected_version
+        if not update_data:
+            # Пустое изменение не меняет версию и время изменения записи
+            user = await User.get_or_none(**filters)
+        else:
+            # auto_now не применяется к UPDATE, время изменения задаем явно
+            # (в PostgreSQL триггер заменяет его временем начала транзакции по часам базы данных)
+            update_data["updated_at"] = timezone.now()
+            increments = ["version", "token_version"] if revoke_tokens else ["version"]
+            try:
+                user = await UserService._update_returning(
+                    update_data, increments, bool(update_data.keys() & SEARCH_KEY_FIELDS), **filters
+                )
+            except IntegrityError as exc:
+                if not is_duplicate_email(exc):
+                    raise
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=DUPLICATE_EMAIL_MESSAGE)
+        if user is None:
+            if expected_version is not None and await User.exists(id=user_id):
+                raise HTTPException(
+                    status_code=status.HTTP_412_PRECONDITION_FAILED,
+                    detail="Пользователь был изменен другим запросом",
+                )
+            return None
+        if update_data.keys() & SEARCH_KEY_FIELDS:
+            user_search_index.add(user.id, user.search_key)
+        if update_data.keys() & COUNT_FILTER_FIELDS:
+            users_count_cache.clear()
+        UserService.invalidate_principal(user_id)
+        token_versions.set(user_id, user.token_version)
+        return user
+
+    @staticmethod
+    async def get_user_version(user_id: int) -> Optional[int]:
+        """
+        Возвращает версию записи пользователя, не загружая остальные поля.
+        Если пользователь не найден, возвращает None
+        """
+        return await User.filter(id=user_id).first().values_list("version", flat=True)
+
+    @staticmethod
+    async def _update_returning(
+            values: dict, increments: Sequence[str], refresh_search_key: bool = False, **filters
+    ) -> Optional[User]:
+        """
+        Обновляет запись и возвращает ее. increments - счетчики, которые увеличиваются на 1,
+        refresh_search_key - пересчитать ключ поиска по ФИО в том же UPDATE.
+        В PostgreSQL выполняется один запрос UPDATE ... RETURNING, для остальных СУБД
+        запись обновляется через QuerySet в транзакции и перечитывается отдельным запросом
+        """
+        db = User._meta.db
+        if db.capabilities.dialect != "postgres":
+            counters = {name: F(name) + 1 for name in increments}
+            async with in_transaction() as connection:
+                if refresh_search_key:
+                    names = await User.filter(**filters).using_db(connection).first() \
+                        .values("first_name", "last_name", "other_name")
+                    if names is None:
+                        return None
+                    names.update({name: values[name] for name in SEARCH_KEY_FIELDS if name in values})
+                    values = {**values, "search_key": build_search_key(**names)}
+                if not await User.filter(**filters).using_db(connection).update(**values, **counters):
+                    return None
+                return await User.filter(id=filters["id"]).using_db(connection).first()
+        assignments, params = update_assignments_sql(values, increments, refresh_search_key)
+        conditions = []
+        for name, value in filters.items():
+            params.append(value)
+            conditions.append(f'"{name}" = ${len(params)}')
+        rows = await db.execute_query_dict(
+            f'UPDATE "{User._meta.db_table}" SET {", ".join(assignments)} '
+            f'WHERE {" AND ".join(conditions)} RETURNING *',
+            params,
+        )
+        if not rows:
+            return None
+        # Экземпляр создается как загруженный из базы данных, чтобы save() и delete() работали с этой записью
+        return User._init_from_db(**rows[0])
+
+    @staticmethod
+    async def delete_user(user_id: int) -> int:
+        """
+        Удаляет пользователя по его ID и в той же транзакции оставляет отметку об удалении для ленты изменений.
+        Возвращает количество удаленных записей (0, если пользователь не найден)
+        """
+        async with in_transaction() as connection:
+            deleted = await User.filter(id=user_id).using_db(connection).delete()
+            if deleted:
+                await UserTombstone.create(user_id=user_id, using_db=connection)
+        if deleted:
+            users_count_cache.clear()
+            user_search_index.remove(user_id)
+            UserService.invalidate_principal(user_id)
+            token_versions.set(user_id, 0)
+        return deleted
+
+    @staticmethod
+    def invalidate_principal(user_id: int) -> None:
+        """
+        Удаляет пользователя из кэша аутентифицированных пользователей
+        """
+        principal_cache.discard_where(lambda email, user: user.id == user_id)
 
     @staticmethod
-    async def delete_user(user_id: int) -> bool:
+    async def get_token_version(user_id: int) -> Optional[int]:
         """
-        Удаляет пользователя по его ID
+        Возвращает текущую версию токенов пользователя из кэша или базы данных.
+        Если пользователь не существует, возвращает None
         """
-        user = await UserService.get_user_by_id(user_id)
-        if user:
-            await user.delete()
-            return True
-        return False
+        version = token_versions.get(user_id)
+        if version is None:
+            version = await User.filter(id=user_id).first().values_list("token_version", flat=True) or 0
+            token_versions.set(user_id, version)
+        return version or None
 
     @staticmethod
     async def get_current_user(request: Request) -> User:
@@ -88,6 +274,8 @@ class UserService:
                 status_code=401,
                 detail="Не аутентифицирован",
             )
+        from jose import JWTError, jwt
+
         try:
             payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
             email: str = payload.get("sub")
@@ -117,22 +305,169 @@ class UserService:
         """
         try:
             user = await User.get(email=email)
-            if not bcrypt.verify(password, user.password_hash):
+            if not await password_hasher.verify(password, user.password_hash):
                 logger.warning(f"Неуспешная попытка входа для пользователя {email}")
                 return None
+            if password_hasher.needs_rehash(user.password_hash):
+                UserService.schedule_rehash(user, password)
             return user
         except DoesNotExist:
             logger.warning(f"Попытка входа с несуществующим email: {email}")
             return None
 
     @staticmethod
-    async def get_users(page: int, size: int) -> Tuple[List[User], int]:
+    def schedule_rehash(user: User, password: str) -> None:
+        """
+        Запускает в фоне перехеширование пароля с текущей стоимостью bcrypt.
+        Пропускается, если для пользователя уже идет перехеширование или пул воркеров занят
+        """
+        if password_hasher.pending >= password_hasher.workers:
+            return
+        if any(task.get_name() == f"rehash-{user.id}" for task in UserService._rehash_tasks):
+            return
+        task = asyncio.create_task(
+            UserService._rehash_password(user.id, password, user.password_hash), name=f"rehash-{user.id}"
+        )
+        UserService._rehash_tasks.add(task)
+        task.add_done_callback(UserService._rehash_tasks.discard)
+
+    @staticmethod
+    async def _rehash_password(user_id: int, password: str, old_hash: str) -> None:
         """
-        Получает список пользователей с пагинацией
+        Сохраняет новый хеш пароля, только если пароль не был изменен за время перехеширования
         """
-        total = await User.all().count()
-        users = await User.all().offset((page - 1) * size).limit(size)
-        return users, total
+        try:
+            new_hash = await password_hasher.hash(password)
+            await User.filter(id=user_id, password_hash=old_hash).update(password_hash=new_hash)
+        except Exception as exc:
+            logger.warning(f"Не удалось перехешировать пароль пользователя {user_id}: {exc!r}")
+
+    @staticmethod
+    def build_user_filters(
+            city: Optional[int] = None,
+            is_admin: Optional[bool] = None,
+            last_name: Optional[str] = None,
+            birthday_from: Optional[date] = None,
+            birthday_to: Optional[date] = None,
+    ) -> Dict[str, Any]:
+        """
+        Формирует условия фильтрации списка пользователей.
+        Префикс фамилии ищется через LIKE 'префикс%': в PostgreSQL его обслуживает индекс
+        по last_name с классом операторов text_pattern_ops, который не зависит от правил сортировки базы данных
+        """
+        filters: Dict[str, Any] = {}
+        if city is not None:
+            filters["city"] = city
+        if is_admin is not None:
+            filters["is_admin"] = is_admin
+        if last_name:
+            filters["last_name__startswith"] = last_name
+        if birthday_from is not None:
+            filters["birthday__gte"] = birthday_from
+        if birthday_to is not None:
+            filters["birthday__lte"] = birthday_to
+        return filters
+
+    @staticmethod
+    async def count_users(filters: Optional[Dict[str, Any]] = None) -> Tuple[int, str]:
+        """
+        Возвращает количество пользователей (с учетом фильтров) и фактически использованную стратегию подсчета
+        """
+        filters = filters or {}
+        strategy = settings.users_count_strategy
+        if strategy == "cached":
+            key = tuple(sorted(filters.items()))
+            total = users_count_cache.get(key)
+            if total is None:
+                total = await User.filter(**filters).count()
+                users_count_cache.set(key, total)
+            return total, "cached"
+        if strategy == "estimate":
+            total = await UserService._estimate_users_count(filters)
+            if total is not None:
+                return total, "estimate"
+        return await User.filter(**filters).count(), "exact"
+
+    @staticmethod
+    async def _estimate_users_count(filters: Dict[str, Any]) -> Optional[int]:
+        """
+        Оценивает количество пользователей по статистике планировщика PostgreSQL:
+        для всей таблицы - по pg_class.reltuples, для фильтров - по EXPLAIN.
+        Возвращает None, если оценка недоступна (другая СУБД или таблица еще не анализировалась)
+        """
+        db = User._meta.db
+        if db.capabilities.dialect != "postgres":
+            return None
+        if filters:
+            rows = await db.execute_query_dict(f"EXPLAIN (FORMAT JSON) {User.filter(**filters).sql()}")
+            if not rows:
+                return None
+            plan = rows[0]["QUERY PLAN"]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        rows = await db.execute_query_dict(
+            "SELECT reltuples::bigint AS estimate FROM pg_class WHERE oid = to_regclass($1)",
+            [User._meta.db_table],
+        )
+        if not rows or rows[0]["estimate"] < 0:
+            return None
+        return rows[0]["estimate"]
+
+    @staticmethod
+    async def get_users(
+            page: int,
+            size: int,
+            filters: Optional[Dict[str, Any]] = None,
+            fields: Optional[Sequence[str]] = None
+    ) -> List[Union[User, dict]]:
+        """
+        Получает список пользователей с пагинацией.
+        Если указаны fields, из базы данных читаются только эти столбцы и возвращаются словари
+        """
+        query = User.filter(**(filters or {})).order_by("id").offset((page - 1) * size).limit(size)
+        if fields:
+            return await query.values(*fields)
+        return await query
+
+    @staticmethod
+    async def get_users_after(
+            after_id: Optional[int],
+            size: int,
+            filters: Optional[Dict[str, Any]] = None,
+            fields: Optional[Sequence[str]] = None
+    ) -> Tuple[List[Union[User, dict]], Optional[int]]:
+        """
+        Получает страницу пользователей по курсору (keyset-пагинация по id).
+        Возвращает пользователей и id для следующего курсора.
+        Если указаны fields, из базы данных читаются только эти столбцы (и id) и возвращаются словари
+        """
+        query = User.filter(**(filters or {}))
+        if after_id is not None:
+            query = query.filter(id__gt=after_id)
+        # Запрашиваем на одну запись больше, чтобы понять, есть ли следующая страница
+        query = query.order_by("id").limit(size + 1)
+        if fields:
+            users = await query.values(*dict.fromkeys(("id", *fields)))
+            next_id = users[size - 1]["id"] if len(users) > size else None
+        else:
+            users = await query
+            next_id = users[size - 1].id if len(users) > size else None
+        return users[:size], next_id
+
+    @staticmethod
+    async def get_users_by_ids(ids: Sequence[int], fields: Sequence[str]) -> Tuple[List[dict], List[int]]:
+        """
+        Получает пользователей по списку id одним запросом id IN (...).
+        Возвращает найденных пользователей в порядке запроса (без повторов) и отсутствующие id
+        """
+        unique_ids = list(dict.fromkeys(ids))
+        rows = await User.filter(id__in=unique_ids).values(*dict.fromkeys(("id", *fields)))
+        found = {row["id"]: row for row in rows}
+        return (
+            [found[user_id] for user_id in unique_ids if user_id in found],
+            [user_id for user_id in unique_ids if user_id not in found],
+        )
 
     async def get_user_by_email(email: str) -> Optional[User]:
         """
@@ -0,0 +1,244 @@
+"""
+Нагрузочный тест API на реальном приложении app.main:app.
+
+Запросы идут через ASGI-транспорт httpx напрямую в приложение, без сети.
+База данных по умолчанию - SQLite в памяти с заранее заполненными пользователями.
+Для каждого сценария считаются пропускная способность и перцентили задержки p50/p95/p99.
+Результаты сохраняются в JSON, чтобы сравнивать их между коммитами.
+
+Запуск из корня проекта:
+    python -m benchmarks.load --users 5000 --requests 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+os.environ.setdefault("TESTING", "1")
+
+from httpx import ASGITransport, AsyncClient
+
+from app.core.config import settings
+from app.core.hashing import password_hasher
+from app.db.database import close_db, init_db
+from app.db.models import User
+from app.main import app
+
+# Логи каждого запроса httpx искажают замеры и засоряют вывод
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+BASE_URL = "http://benchmark"
+PASSWORD = "benchmarkpassword"
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """
+    Возвращает перцентиль методом ближайшего ранга
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(percent / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def seed_users(count: int, run_id: str) -> List[str]:
+    """
+    Заполняет базу пользователями. Хеш пароля считается один раз и переиспользуется.
+    Email всех пользователей запуска начинается с bench_<run_id>_, по этому префиксу они удаляются
+    """
+    password_hash = await password_hasher.hash(PASSWORD)
+    emails = [f"bench_{run_id}_{index}@example.com" for index in range(count)]
+    users = [
+        User(
+            first_name=f"Bench{index}",
+            last_name="User",
+            email=email,
+            password_hash=password_hash,
+            is_admin=index == 0,
+            city=index % 90,
+        )
+        for index, email in enumerate(emails)
+    ]
+    await User.bulk_create(users, batch_size=1000)
+    return emails
+
+
+async def login(client: AsyncClient, email: str) -> None:
+    response = await client.post("/users/login", json={"email": email, "password": PASSWORD})
+    response.raise_for_status()
+    client.cookies.set("access_token", response.json()["access_token"])
+
+
+async def run_scenario(
+        name: str,
+        request: Callable[[int], Awaitable[int]],
+        requests: int,
+        concurrency: int,
+) -> Dict[str, float]:
+    """
+    Выполняет request(i) requests раз с ограничением параллельности и собирает статистику
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(index: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            status = await request(index)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+    print(f"{name:>16}: {result['throughput_rps']:>9} rps  p50={result['p50_ms']}ms  "
+          f"p95={result['p95_ms']}ms  p99={result['p99_ms']}ms  errors={errors}")
+    return result
+
+
+async def run(args: argparse.Namespace) -> dict:
+    settings.database_url = args.db_url
+    # Все запросы идут с одного адреса, ограничение частоты входа исказило бы login_storm
+    settings.login_rate_limit_enabled = False
+    await init_db()
+    run_id = uuid.uuid4().hex[:8]
+    try:
+        emails = await seed_users(args.users, run_id)
+        admin_email, user_emails = emails[0], emails[1:]
+        random.seed(args.seed)
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url=BASE_URL) as anonymous, \
+                AsyncClient(transport=ASGITransport(app=app), base_url=BASE_URL) as user_client, \
+                AsyncClient(transport=ASGITransport(app=app), base_url=BASE_URL) as admin_client:
+            await login(user_client, user_emails[0])
+            await login(admin_client, admin_email)
+
+            async def login_storm(index: int) -> int:
+                email = random.choice(user_emails)
+                response = await anonymous.post("/users/login", json={"email": email, "password": PASSWORD})
+                return response.status_code
+
+            async def current_polling(index: int) -> int:
+                return (await user_client.get("/users/current")).status_code
+
+            last_page = max(1, args.users // args.page_size)
+
+            async def deep_pagination(index: int) -> int:
+                # Страницы из последней десятой части таблицы
+                page = random.randint(max(1, last_page - last_page // 10), last_page)
+                response = await admin_client.get("/private/users", params={"page": page, "size": args.page_size})
+                return response.status_code
+
+            async def admin_crud(index: int) -> int:
+                response = await admin_client.post("/private/users", json={
+                    "first_name": "Crud",
+                    "last_name": "User",
+                    "email": f"bench_{run_id}_crud_{index}@example.com",
+                    "password": PASSWORD,
+                    "is_admin": False,
+                })
+                if response.status_code >= 400:
+                    return response.status_code
+                user_id = response.json()["id"]
+                for response in (
+                    await admin_client.get(f"/private/users/{user_id}"),
+                    await admin_client.patch(f"/private/users/{user_id}", json={"city": index % 90}),
+                    await admin_client.delete(f"/private/users/{user_id}"),
+                ):
+                    if response.status_code >= 400:
+                        return response.status_code
+                return 200
+
+            scenarios = {
+                "login_storm": login_storm,
+                "current_polling": current_polling,
+                "deep_pagination": deep_pagination,
+                "admin_crud": admin_crud,
+            }
+            selected = args.scenarios or list(scenarios)
+            results = {}
+            for name in selected:
+                results[name] = await run_scenario(name, scenarios[name], args.requests, args.concurrency)
+    finally:
+        # Пользователи запуска удаляются, чтобы не оставлять их в базе данных, заданной --db-url
+        try:
+            deleted = await User.filter(email__startswith=f"bench_{run_id}_").delete()
+            print(f"Удалено пользователей бенчмарка: {deleted}")
+        finally:
+            await close_db()
+        password_hasher.shutdown()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "parameters": {
+            "db_url": args.db_url.split("@")[-1],
+            "users": args.users,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "page_size": args.page_size,
+            "seed": args.seed,
+            "password_hash_workers": settings.password_hash_workers,
+            "password_hash_rounds": password_hasher.target_rounds,
+        },
+        "scenarios": results,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API пользователей")
+    parser.add_argument("--db-url", default="sqlite://:memory:", help="URL базы данных для теста")
+    parser.add_argument("--users", type=int, default=2000, help="Количество пользователей в базе")
+    parser.add_argument("--requests", type=int, default=200, help="Количество запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=10, help="Количество параллельных запросов")
+    parser.add_argument("--page-size", type=int, default=50, help="Размер страницы для пагинации")
+    parser.add_argument("--seed", type=int, default=42, help="Seed для выбора пользователей и страниц")
+    parser.add_argument("--scenarios", nargs="*", choices=[
+        "login_storm", "current_polling", "deep_pagination", "admin_crud"
+    ], help="Запускаемые сценарии (по умолчанию все)")
+    parser.add_argument("--output", type=Path, help="Файл для результатов в JSON")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    report = asyncio.run(run(args))
+    output = args.output or RESULTS_DIR / f"load_{report['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"Результаты сохранены в {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Бенчмарк сериализации страницы списка пользователей.
+
+Сравнивает стоимость одной строки:
+- pydantic: прежний путь FastAPI - валидация через response_model (orm_mode, EmailStr),
+  jsonable_encoder и json.dumps;
+- fast_*: FastJSONResponse - проекция полей и кодирование сразу в байты (orjson или json).
+
+База данных не используется: строки создаются в памяти как объекты User или словари из values().
+
+Запуск из корня проекта:
+    python -m benchmarks.serialization --rows 100 --repeat 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Sequence
+
+os.environ.setdefault("TESTING", "1")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from app.core import serialization
+from app.core.serialization import FastJSONResponse
+from app.db.models import User
+from app.main import app
+from app.schemas.user_schema import USERS_LIST_FIELDS
+from benchmarks.load import RESULTS_DIR, git_commit
+
+META = {"pagination": {"total": 1000000, "size": 0, "after": "eyJpZCI6MTAwfQ", "count_strategy": "exact"}}
+
+
+def make_users(count: int) -> List[User]:
+    return [
+        User(
+            id=index,
+            first_name=f"Имя{index}",
+            last_name=f"Фамилия{index}",
+            other_name="Отчество",
+            email=f"user_{index}@example.com",
+            phone="+70000000000",
+            birthday=date(1990, 1, 1),
+            is_admin=False,
+            password_hash="$2b$12$" + "x" * 53,
+            city=index % 90,
+            additional_info="дополнительная информация " * 10,
+        )
+        for index in range(count)
+    ]
+
+
+def project_rows(rows: Iterable[Any], fields: Sequence[str]) -> List[dict]:
+    """
+    Оставляет в строках только указанные поля. Строки - объекты моделей или словари из values()
+    """
+    return [
+        {field: row[field] for field in fields} if isinstance(row, dict)
+        else {field: getattr(row, field) for field in fields}
+        for row in rows
+    ]
+
+
+def list_response_field():
+    for route in app.routes:
+        if getattr(route, "path", None) == "/users/users" and "GET" in route.methods:
+            return route.response_field
+    raise RuntimeError("Маршрут /users/users не найден")
+
+
+def measure(render: Callable[[], bytes], repeat: int) -> float:
+    """
+    Возвращает лучшее время одного вызова render из repeat попыток (в секундах)
+    """
+    render()
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(args: argparse.Namespace) -> dict:
+    users = make_users(args.rows)
+    values_rows = project_rows(users, ("id", "first_name", "last_name", "email"))
+    field = list_response_field()
+    loop = asyncio.new_event_loop()
+
+    def pydantic_path() -> bytes:
+        content = {"data": [
+            {"id": user.id, "first_name": user.first_name, "last_name": user.last_name, "email": user.email}
+            for user in users
+        ], "meta": META}
+        value = loop.run_until_complete(serialize_response(field=field, response_content=content))
+        return JSONResponse(value).body
+
+    def fast_orm_path() -> bytes:
+        return FastJSONResponse({"data": project_rows(users, USERS_LIST_FIELDS), "meta": META}).body
+
+    def fast_values_path() -> bytes:
+        return FastJSONResponse({"data": project_rows(values_rows, USERS_LIST_FIELDS), "meta": META}).body
+
+    # Все пути должны давать один и тот же документ
+    assert json.loads(pydantic_path()) == json.loads(fast_orm_path()) == json.loads(fast_values_path())
+
+    paths: Dict[str, Callable[[], bytes]] = {
+        "pydantic": pydantic_path,
+        f"fast_orm_{serialization.JSON_ENCODER}": fast_orm_path,
+        f"fast_values_{serialization.JSON_ENCODER}": fast_values_path,
+    }
+    results = {}
+    for name, render in paths.items():
+        results[name] = measure(render, args.repeat)
+    if serialization.orjson is not None:
+        # Тот же быстрый путь без orjson (стандартный модуль json)
+        orjson, serialization.orjson = serialization.orjson, None
+        try:
+            results["fast_values_json"] = measure(fast_values_path, args.repeat)
+        finally:
+            serialization.orjson = orjson
+    loop.close()
+
+    baseline = results["pydantic"]
+    report = {}
+    for name, seconds in results.items():
+        report[name] = {
+            "page_ms": round(seconds * 1000, 4),
+            "per_row_us": round(seconds / args.rows * 1_000_000, 3),
+            "speedup": round(baseline / seconds, 2),
+        }
+        print(f"{name:>22}: {report[name]['per_row_us']:>9} мкс/строка  "
+              f"{report[name]['page_ms']:>8} мс/страница  x{report[name]['speedup']}")
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "parameters": {"rows": args.rows, "repeat": args.repeat, "encoder": serialization.JSON_ENCODER},
+        "paths": report,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк сериализации списка пользователей")
+    parser.add_argument("--rows", type=int, default=100, help="Количество строк на странице")
+    parser.add_argument("--repeat", type=int, default=200, help="Количество повторов для каждого способа")
+    parser.add_argument("--output", type=Path, help="Файл для результатов в JSON")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    report = run(args)
+    output = args.output or RESULTS_DIR / f"serialization_{report['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"Результаты сохранены в {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "users" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "first_name" VARCHAR(50) NOT NULL,
+    "last_name" VARCHAR(50) NOT NULL,
+    "other_name" VARCHAR(50),
+    "email" VARCHAR(255) NOT NULL UNIQUE,
+    "phone" VARCHAR(20),
+    "birthday" DATE,
+    "is_admin" BOOL NOT NULL  DEFAULT False,
+    "password_hash" VARCHAR(128) NOT NULL,
+    "city" INT,
+    "additional_info" TEXT
+);
+COMMENT ON TABLE "users" IS 'Модель пользователя для системы';
+CREATE TABLE IF NOT EXISTS "aerich" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "version" VARCHAR(255) NOT NULL,
+    "app" VARCHAR(100) NOT NULL,
+    "content" JSONB NOT NULL
+);
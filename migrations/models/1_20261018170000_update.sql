@@ -0,0 +1,39 @@
+-- upgrade --
+ALTER TABLE "users" ADD COLUMN IF NOT EXISTS "version" INT NOT NULL  DEFAULT 1;
+ALTER TABLE "users" ADD COLUMN IF NOT EXISTS "token_version" INT NOT NULL  DEFAULT 1;
+ALTER TABLE "users" ADD COLUMN IF NOT EXISTS "created_at" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE "users" ADD COLUMN IF NOT EXISTS "updated_at" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE "users" ADD COLUMN IF NOT EXISTS "search_key" VARCHAR(160);
+CREATE INDEX IF NOT EXISTS "idx_users_last_na_0d2865" ON "users" ("last_name");
+CREATE INDEX IF NOT EXISTS "idx_users_last_name_pattern" ON "users" ("last_name" text_pattern_ops);
+CREATE INDEX IF NOT EXISTS "idx_users_birthda_48ada4" ON "users" ("birthday");
+CREATE INDEX IF NOT EXISTS "idx_users_city_24426c" ON "users" ("city", "id");
+CREATE INDEX IF NOT EXISTS "idx_users_is_admi_cea6a7" ON "users" ("is_admin", "id");
+CREATE INDEX IF NOT EXISTS "idx_users_updated_803283" ON "users" ("updated_at", "id");
+CREATE TABLE IF NOT EXISTS "user_tombstones" (
+    "id" BIGSERIAL NOT NULL PRIMARY KEY,
+    "user_id" INT NOT NULL,
+    "deleted_at" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS "idx_user_tombst_deleted_3660fd" ON "user_tombstones" ("deleted_at", "id");
+COMMENT ON TABLE "user_tombstones" IS 'Отметка об удалении пользователя для ленты изменений';
+CREATE TABLE IF NOT EXISTS "rate_limit_buckets" (
+    "key" VARCHAR(255) NOT NULL  PRIMARY KEY,
+    "tokens" DOUBLE PRECISION NOT NULL,
+    "updated_at" DOUBLE PRECISION NOT NULL
+);
+COMMENT ON TABLE "rate_limit_buckets" IS 'Корзина токенов ограничителя частоты запросов, общая для всех процессов приложения';
+-- downgrade --
+DROP TABLE IF EXISTS "rate_limit_buckets";
+DROP TABLE IF EXISTS "user_tombstones";
+DROP INDEX IF EXISTS "idx_users_updated_803283";
+DROP INDEX IF EXISTS "idx_users_is_admi_cea6a7";
+DROP INDEX IF EXISTS "idx_users_city_24426c";
+DROP INDEX IF EXISTS "idx_users_birthda_48ada4";
+DROP INDEX IF EXISTS "idx_users_last_name_pattern";
+DROP INDEX IF EXISTS "idx_users_last_na_0d2865";
+ALTER TABLE "users" DROP COLUMN IF EXISTS "search_key";
+ALTER TABLE "users" DROP COLUMN IF EXISTS "updated_at";
+ALTER TABLE "users" DROP COLUMN IF EXISTS "created_at";
+ALTER TABLE "users" DROP COLUMN IF EXISTS "token_version";
+ALTER TABLE "users" DROP COLUMN IF EXISTS "version";
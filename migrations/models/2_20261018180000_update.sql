@@ -0,0 +1,15 @@
+-- upgrade --
+CREATE OR REPLACE FUNCTION "users_stamp_updated_at"() RETURNS trigger AS $$ BEGIN NEW."updated_at" = now(); RETURN NEW; END $$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS "users_updated_at_insert" ON "users";
+CREATE TRIGGER "users_updated_at_insert" BEFORE INSERT ON "users" FOR EACH ROW EXECUTE FUNCTION "users_stamp_updated_at"();
+DROP TRIGGER IF EXISTS "users_updated_at_update" ON "users";
+CREATE TRIGGER "users_updated_at_update" BEFORE UPDATE ON "users" FOR EACH ROW WHEN (NEW."updated_at" IS DISTINCT FROM OLD."updated_at") EXECUTE FUNCTION "users_stamp_updated_at"();
+CREATE OR REPLACE FUNCTION "user_tombstones_stamp_deleted_at"() RETURNS trigger AS $$ BEGIN NEW."deleted_at" = now(); RETURN NEW; END $$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS "user_tombstones_deleted_at_insert" ON "user_tombstones";
+CREATE TRIGGER "user_tombstones_deleted_at_insert" BEFORE INSERT ON "user_tombstones" FOR EACH ROW EXECUTE FUNCTION "user_tombstones_stamp_deleted_at"();
+-- downgrade --
+DROP TRIGGER IF EXISTS "user_tombstones_deleted_at_insert" ON "user_tombstones";
+DROP FUNCTION IF EXISTS "user_tombstones_stamp_deleted_at"();
+DROP TRIGGER IF EXISTS "users_updated_at_update" ON "users";
+DROP TRIGGER IF EXISTS "users_updated_at_insert" ON "users";
+DROP FUNCTION IF EXISTS "users_stamp_updated_at"();
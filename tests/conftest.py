@@ -1,5 +1,6 @@
 import asyncio
 import os
+import uuid
 
 import pytest
 from httpx import AsyncClient
@@ -8,6 +9,9 @@ os.environ['TESTING'] = '1'
 
 from app.db.database import init_db, close_db
 from app.main import app
+from app.schemas.user_schema import CreateUser
+from app.services.user_search_service import user_search_index
+from app.services.user_service import UserService, principal_cache, token_versions, users_count_cache
 
 @pytest.fixture(scope="session")
 def event_loop():
@@ -22,9 +26,50 @@ async def initialize_db():
     await init_db(test=True)
     yield
     await close_db()
+    # Кэши процесса не должны переживать базу данных, с которой работал модуль тестов
+    for cache in (principal_cache, token_versions, users_count_cache, user_search_index):
+        cache.clear()
 
 @pytest.fixture(scope="module")
 async def client(initialize_db):
     """Предоставляет асинхронного клиента для тестирования FastAPI приложения."""
     async with AsyncClient(app=app, base_url="http://testserver") as ac:
-        yield ac
\ No newline at end of file
+        yield ac
+
+
+async def login_as(client: AsyncClient, is_admin: bool):
+    """Создает пользователя, выполняет вход от его имени и сохраняет токен в cookies клиента."""
+    email = f"{'admin' if is_admin else 'user'}_{uuid.uuid4()}@example.com"
+    user = await UserService.create_user_service(CreateUser(
+        first_name="Admin" if is_admin else "Regular",
+        last_name="User",
+        email=email,
+        password="testpassword",
+        is_admin=is_admin,
+    ))
+    response = await client.post("/users/login", json={"email": email, "password": "testpassword"})
+    assert response.status_code == 200
+    client.cookies.set("access_token", response.json()["access_token"])
+    return user
+
+
+@pytest.fixture
+async def admin_user(client):
+    """Администратор, от имени которого выполнен вход в client; удаляется после теста."""
+    user = await login_as(client, is_admin=True)
+    yield user
+    await UserService.delete_user(user.id)
+
+
+@pytest.fixture
+async def admin_client(client, admin_user):
+    """Клиент с токеном администратора в cookies."""
+    yield client
+
+
+@pytest.fixture
+async def user_client(client):
+    """Клиент с токеном обычного пользователя в cookies; пользователь удаляется после теста."""
+    user = await login_as(client, is_admin=False)
+    yield client
+    await UserService.delete_user(user.id)
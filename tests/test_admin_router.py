@@ -1,9 +1,13 @@
+import json
 import uuid
 import pytest
 from httpx import AsyncClient
 
+from app.core.auth import create_access_token
+from app.core.config import settings
 from app.db.models import User
-from app.schemas.user_schema import LoginModel, CreateUser
+from app.schemas.user_schema import LoginModel, CreateUser, PrivateUpdateUser
+from app.services.user_import_service import LINE_TOO_LONG_MESSAGE
 from app.services.user_service import UserService
 
 
@@ -177,4 +181,617 @@ async def test_admin_create_user(client: AsyncClient, initialize_db):
 
         # Удаляем администратора
         delete_result = await UserService.delete_user(admin.id)
-        assert delete_result, f"Не удалось удалить администратора с ID {admin.id}."
\ No newline at end of file
+        assert delete_result, f"Не удалось удалить администратора с ID {admin.id}."
+
+@pytest.mark.asyncio
+async def test_admin_get_users_cursor_pagination(admin_client: AsyncClient):
+    created_users = []
+    try:
+        for index in range(3):
+            user = await UserService.create_user_service(CreateUser(
+                first_name=f"Cursor{index}",
+                last_name="User",
+                email=generate_unique_email("cursor"),
+                password="cursorpassword",
+                is_admin=False,
+            ))
+            created_users.append(user)
+
+        # Проходим по всем страницам по курсору
+        seen_ids = []
+        after = None
+        while True:
+            params = {"size": 2}
+            if after:
+                params["after"] = after
+            response = await admin_client.get("/private/users", params=params)
+            assert response.status_code == 200
+            data = response.json()
+            assert "page" not in data["meta"]["pagination"]
+            # Количество считается только для первой страницы
+            if after:
+                assert data["meta"]["pagination"]["total"] is None
+            else:
+                assert data["meta"]["pagination"]["total"] >= len(created_users)
+            seen_ids.extend(user["id"] for user in data["data"])
+            after = data["meta"]["pagination"]["after"]
+            if after is None:
+                break
+
+        assert seen_ids == sorted(seen_ids), "Курсорная пагинация должна идти по возрастанию id."
+        assert len(seen_ids) == len(set(seen_ids)), "Страницы не должны пересекаться."
+        for user in created_users:
+            assert user.id in seen_ids, f"Пользователь {user.id} не найден при обходе по курсору."
+
+        # Некорректный курсор
+        response = await admin_client.get("/private/users", params={"size": 2, "after": "not-a-cursor"})
+        assert response.status_code == 400
+    finally:
+        for user in created_users:
+            await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_admin_import_users(admin_client: AsyncClient, monkeypatch):
+    first_email = generate_unique_email("import")
+    second_email = generate_unique_email("import")
+    csv_email = generate_unique_email("import_csv")
+    imported_emails = []
+    ndjson_body = "\n".join([
+        json.dumps({"first_name": "Import1", "last_name": "User", "email": first_email,
+                    "password": "importpassword", "is_admin": False}),
+        "{broken json",
+        json.dumps({"first_name": "Import2", "last_name": "User", "email": second_email,
+                    "password": "importpassword", "is_admin": False, "city": 5}),
+        json.dumps({"first_name": "Duplicate", "last_name": "User", "email": first_email,
+                    "password": "importpassword", "is_admin": False}),
+        json.dumps({"first_name": "Invalid", "email": "not-an-email"}),
+    ])
+
+    try:
+        response = await admin_client.post(
+            "/private/users/import",
+            content=ndjson_body,
+            params={"batch_size": 2},
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 200, response.text
+        report = response.json()
+        assert report["total"] == 5
+        assert report["created"] == 2
+        assert report["failed"] == 3
+        # В отчете только ошибки, в порядке строк
+        assert [row["line"] for row in report["errors"]] == [2, 4, 5]
+        assert report["errors_truncated"] is False
+
+        user = await User.get(email=second_email)
+        assert user.city == 5
+
+        # Импорт в формате CSV
+        csv_body = "first_name,last_name,email,password,is_admin,city\n" \
+                   f"Csv,User,{csv_email},csvpassword,false,\n"
+        response = await admin_client.post(
+            "/private/users/import", content=csv_body, headers={"Content-Type": "text/csv"}
+        )
+        assert response.status_code == 200, response.text
+        assert response.json()["created"] == 1
+        csv_user = await User.get(email=csv_email)
+        assert csv_user.city is None
+        assert csv_user.is_admin is False
+
+        # Значение в кавычках с переводом строки и строка не в UTF-8
+        multiline_email = generate_unique_email("import_csv")
+        imported_emails.append(multiline_email)
+        csv_body = "first_name,last_name,email,password,is_admin,additional_info\n".encode() \
+            + f'Csv,Multiline,{multiline_email},csvpassword,false,"first line\nsecond line"\n'.encode() \
+            + b"Csv,Broken,\xff\xfe,csvpassword,false,\n"
+        response = await admin_client.post(
+            "/private/users/import", content=csv_body, headers={"Content-Type": "text/csv"}
+        )
+        assert response.status_code == 200, response.text
+        report = response.json()
+        assert (report["total"], report["created"], report["failed"]) == (2, 1, 1)
+        assert report["errors"][0]["line"] == 4
+        assert (await User.get(email=multiline_email)).additional_info == "first line\nsecond line"
+
+        # Ограничение количества ошибок в отчете
+        monkeypatch.setattr(settings, "import_max_reported_errors", 2)
+        response = await admin_client.post(
+            "/private/users/import", content="{broken\n" * 5, headers={"Content-Type": "application/x-ndjson"}
+        )
+        report = response.json()
+        assert report["failed"] == 5
+        assert [row["line"] for row in report["errors"]] == [1, 2]
+        assert report["errors_truncated"] is True
+
+        # Слишком длинная строка - ошибка этой строки, следующие строки читаются как обычно
+        monkeypatch.setattr(settings, "import_max_line_bytes", 200)
+        long_email = generate_unique_email("import")
+        imported_emails.append(long_email)
+        ndjson_body = json.dumps({"first_name": "Long", "additional_info": "x" * 500}) + "\n" + json.dumps({
+            "first_name": "Short", "last_name": "User", "email": long_email, "password": "importpassword",
+            "is_admin": False
+        })
+
+        async def chunks():
+            # Перевод строки и длинная строка разбиты по разным фрагментам потока
+            for start in range(0, len(ndjson_body), 10):
+                yield ndjson_body[start:start + 10].encode()
+
+        response = await admin_client.post(
+            "/private/users/import", content=chunks(), headers={"Content-Type": "application/x-ndjson"}
+        )
+        report = response.json()
+        assert (report["total"], report["created"], report["failed"]) == (2, 1, 1)
+        assert report["errors"][0] == {"line": 1, "status": "error", "detail": LINE_TOO_LONG_MESSAGE}
+
+        response = await admin_client.post("/private/users/import", content="", params={"batch_size": 10 ** 9})
+        assert response.status_code == 422
+
+        # Импортированный пользователь может войти с паролем из файла
+        response = await admin_client.post("/users/login", json={"email": csv_email, "password": "csvpassword"})
+        assert response.status_code == 200
+    finally:
+        for user in await User.filter(email__in=[first_email, second_email, csv_email, *imported_emails]):
+            await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_admin_export_users(admin_client: AsyncClient, admin_user, monkeypatch):
+    # Маленький размер пачки, чтобы выгрузка шла в несколько запросов к базе
+    monkeypatch.setattr(settings, "export_chunk_size", 1)
+    user = await UserService.create_user_service(CreateUser(
+        first_name="Export",
+        last_name="User",
+        email=generate_unique_email("export"),
+        birthday="1990-01-01",
+        password="exportpassword",
+        is_admin=False,
+    ))
+    try:
+        response = await admin_client.get("/private/users/export", params={"fields": "email,birthday"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert {"email": user.email, "birthday": "1990-01-01"} in rows
+        assert {"email": admin_user.email, "birthday": None} in rows
+        assert all(set(row) == {"email", "birthday"} for row in rows)
+
+        response = await admin_client.get("/private/users/export", params={"format": "csv", "fields": "id,email"})
+        assert response.status_code == 200
+        lines = response.text.splitlines()
+        assert lines[0] == "id,email"
+        assert f"{user.id},{user.email}" in lines
+
+        # Поле password_hash не входит в ответ администратора и не может быть выгружено
+        response = await admin_client.get("/private/users/export", params={"fields": "id,password_hash"})
+        assert response.status_code == 400
+    finally:
+        await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_admin_update_user_with_if_match(admin_client: AsyncClient, admin_user):
+    user = await UserService.create_user_service(CreateUser(
+        first_name="Versioned",
+        last_name="User",
+        email=generate_unique_email("versioned"),
+        password="versionedpassword",
+        is_admin=False,
+        city=1,
+    ))
+    try:
+        response = await admin_client.get(f"/private/users/{user.id}")
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+
+        # Обновление с актуальной версией проходит и возвращает новый ETag
+        response = await admin_client.patch(
+            f"/private/users/{user.id}", json={"city": 2}, headers={"If-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.json()["city"] == 2
+        assert response.headers["etag"] != etag
+
+        # Повторное обновление со старой версией отклоняется
+        response = await admin_client.patch(
+            f"/private/users/{user.id}", json={"city": 3}, headers={"If-Match": etag}
+        )
+        assert response.status_code == 412
+        assert (await User.get(id=user.id)).city == 2
+
+        # Обязательное поле нельзя сбросить в null
+        response = await admin_client.patch(f"/private/users/{user.id}", json={"first_name": None})
+        assert response.status_code == 422
+
+        # Занятый email отклоняется с кодом 400
+        response = await admin_client.patch(f"/private/users/{user.id}", json={"email": admin_user.email})
+        assert response.status_code == 400
+
+        # Обновление без If-Match затрагивает только переданные поля
+        response = await admin_client.patch(f"/private/users/{user.id}", json={"city": 4})
+        assert response.status_code == 200
+        user_in_db = await User.get(id=user.id)
+        assert user_in_db.city == 4
+        assert user_in_db.first_name == "Versioned"
+    finally:
+        await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_admin_delete_user(admin_client: AsyncClient):
+    user = await UserService.create_user_service(CreateUser(
+        first_name="Deleted",
+        last_name="User",
+        email=generate_unique_email("deleted"),
+        password="deletedpassword",
+        is_admin=False,
+    ))
+    try:
+        response = await admin_client.delete(f"/private/users/{user.id}")
+        assert response.status_code == 204
+        assert not await User.exists(id=user.id)
+
+        # Повторное удаление возвращает 404
+        response = await admin_client.delete(f"/private/users/{user.id}")
+        assert response.status_code == 404
+    finally:
+        await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_admin_get_users_with_filters(admin_client: AsyncClient):
+    # Уникальный номер региона, чтобы не пересекаться с другими тестами
+    city = uuid.uuid4().int % 1000000 + 1000
+    users_data = [
+        ("Smithson", "1985-05-05", False),
+        ("Smirnov", "1995-05-05", False),
+        ("Ivanov", "1990-05-05", True),
+    ]
+    created_users = []
+    try:
+        for last_name, birthday, is_admin in users_data:
+            created_users.append(await UserService.create_user_service(CreateUser(
+                first_name="Filtered",
+                last_name=last_name,
+                email=generate_unique_email("filtered"),
+                birthday=birthday,
+                password="filteredpassword",
+                is_admin=is_admin,
+                city=city,
+            )))
+
+        async def fetch(**params):
+            response = await admin_client.get("/private/users", params={"size": 10, "city": city, **params})
+            assert response.status_code == 200
+            data = response.json()
+            return sorted(user["last_name"] for user in data["data"]), data["meta"]["pagination"]["total"]
+
+        assert await fetch() == (["Ivanov", "Smirnov", "Smithson"], 3)
+        assert await fetch(last_name="Smi") == (["Smirnov", "Smithson"], 2)
+        assert await fetch(last_name="Smit") == (["Smithson"], 1)
+        assert await fetch(is_admin=True) == (["Ivanov"], 1)
+        assert await fetch(birthday_from="1989-01-01", birthday_to="1991-01-01") == (["Ivanov"], 1)
+        assert await fetch(page=1, last_name="Smi", is_admin=False) == (["Smirnov", "Smithson"], 2)
+    finally:
+        for user in created_users:
+            await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_admin_search_users(admin_client: AsyncClient):
+    user = await UserService.create_user_service(CreateUser(
+        first_name="Евгений",
+        last_name="Захарченко",
+        other_name="Пётрович",
+        email=generate_unique_email("search"),
+        password="searchpassword",
+        is_admin=False,
+    ))
+    try:
+        assert user.search_key == "евгений захарченко петрович"
+
+        async def search(q):
+            response = await admin_client.get("/private/users/search", params={"q": q})
+            assert response.status_code == 200
+            return [row["id"] for row in response.json()["data"]]
+
+        # Поиск по части ФИО и с опечаткой
+        assert user.id in await search("Захарч")
+        assert user.id in await search("захарченка евгени")
+        assert await search("Захарченко") == [user.id]
+
+        # После изменения фамилии ключ поиска пересчитывается
+        await UserService.update_user(user.id, PrivateUpdateUser(last_name="Остапенко"))
+        assert (await User.get(id=user.id)).search_key == "евгений остапенко петрович"
+        assert user.id not in await search("Захарченко")
+        assert user.id in await search("Остапенко")
+
+        # Удаленный пользователь не попадает в выдачу
+        await UserService.delete_user(user.id)
+        assert user.id not in await search("Остапенко")
+
+        response = await admin_client.get("/private/users/search", params={"q": "а"})
+        assert response.status_code == 422
+    finally:
+        await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_admin_authorization_from_token_claims(admin_client: AsyncClient, admin_user):
+    assert (await admin_client.get("/private/users", params={"size": 1})).status_code == 200
+
+    # Токен без claims (выпущенный ранее) проверяется через базу данных
+    admin_client.cookies.set("access_token", create_access_token({"sub": admin_user.email}))
+    assert (await admin_client.get("/private/users", params={"size": 1})).status_code == 200
+
+    # Снятие роли администратора отзывает выданные токены
+    admin_client.cookies.set("access_token", create_access_token({"sub": admin_user.email}, user=admin_user))
+    await UserService.update_user(admin_user.id, PrivateUpdateUser(is_admin=False))
+    response = await admin_client.get("/private/users", params={"size": 1})
+    assert response.status_code == 401
+
+    # С новым токеном пользователь уже не администратор
+    login_response = await admin_client.post(
+        "/users/login", json={"email": admin_user.email, "password": "testpassword"}
+    )
+    admin_client.cookies.set("access_token", login_response.json()["access_token"])
+    assert (await admin_client.get("/private/users", params={"size": 1})).status_code == 403
+    assert (await admin_client.get("/users/users", params={"size": 1})).status_code == 200
+
+    # После удаления пользователя его токен не действует
+    await UserService.delete_user(admin_user.id)
+    assert (await admin_client.get("/users/users", params={"size": 1})).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_admin_batch_get_users(admin_client: AsyncClient):
+    users = [
+        await UserService.create_user_service(CreateUser(
+            first_name="Batch",
+            last_name=f"User{index}",
+            email=generate_unique_email("batch"),
+            birthday="1990-01-0" + str(index + 1),
+            password="batchpassword",
+            is_admin=False,
+        ))
+        for index in range(3)
+    ]
+    try:
+        missing_id = max(user.id for user in users) + 100000
+        ids = [users[2].id, missing_id, users[0].id, users[2].id]
+        response = await admin_client.post("/private/users/batch-get", json={"ids": ids})
+        assert response.status_code == 200
+        data = response.json()
+        # Порядок запроса сохраняется, повторы не дублируются
+        assert [user["id"] for user in data["data"]] == [users[2].id, users[0].id]
+        assert data["data"][0]["birthday"] == "1990-01-03"
+        assert "password_hash" not in data["data"][0]
+        assert data["missing"] == [missing_id]
+
+        response = await admin_client.post("/private/users/batch-get", json={"ids": []})
+        assert response.status_code == 422
+        response = await admin_client.post(
+            "/private/users/batch-get", json={"ids": list(range(settings.batch_get_max_ids + 1))}
+        )
+        assert response.status_code == 422
+    finally:
+        for user in users:
+            await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_admin_bulk_update_users(admin_client: AsyncClient, monkeypatch):
+    city = uuid.uuid4().int % 1000000 + 1000
+    users = [
+        await UserService.create_user_service(CreateUser(
+            first_name="Bulk",
+            last_name=f"User{index}",
+            email=generate_unique_email("bulk"),
+            password="bulkpassword",
+            is_admin=False,
+            city=city,
+        ))
+        for index in range(3)
+    ]
+    try:
+        missing_id = max(user.id for user in users) + 100000
+        response = await admin_client.post("/private/users/bulk-update", json={"items": [
+            {"id": users[0].id, "patch": {"city": city + 1}},
+            {"id": missing_id, "patch": {"city": city + 1}},
+            {"id": users[1].id, "patch": {"city": city + 1}},
+            {"id": users[2].id, "patch": {"last_name": "Renamed", "is_admin": True}},
+        ]})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["updated"] == 3
+        assert [row["status"] for row in data["results"]] == ["updated", "not_found", "updated", "updated"]
+
+        user = await User.get(id=users[2].id)
+        assert (user.is_admin, user.version, user.token_version) == (True, 2, 2)
+        assert user.search_key == "bulk renamed"
+        assert await User.filter(city=city + 1).count() == 2
+        updated_at = (await User.get(id=users[0].id)).updated_at
+
+        # Изменение только из password: null ничего не меняет
+        response = await admin_client.post("/private/users/bulk-update", json={"items": [
+            {"id": users[0].id, "patch": {"password": None}},
+        ]})
+        assert response.status_code == 200
+        assert response.json() == {"updated": 0, "results": [{"id": users[0].id, "status": "unchanged"}]}
+        user = await User.get(id=users[0].id)
+        assert (user.version, user.updated_at) == (2, updated_at)
+
+        # Изменение по фильтру
+        response = await admin_client.post("/private/users/bulk-update", json={
+            "filter": {"city": city + 1}, "patch": {"additional_info": "переведен"}
+        })
+        assert response.status_code == 200
+        assert sorted(row["id"] for row in response.json()["results"]) == [users[0].id, users[1].id]
+        assert await User.filter(additional_info="переведен", city=city + 1).count() == 2
+
+        # Конфликт email откатывает всю транзакцию
+        response = await admin_client.post("/private/users/bulk-update", json={"items": [
+            {"id": users[0].id, "patch": {"city": city + 2}},
+            {"id": users[1].id, "patch": {"email": users[2].email}},
+        ]})
+        assert response.status_code == 400
+        assert not await User.filter(city=city + 2).exists()
+
+        # Некорректные запросы
+        for body in (
+                {"filter": {}, "patch": {"city": 1}},
+                {"filter": {"city": city}, "patch": {"password": "new"}},
+                {"items": [{"id": users[0].id, "patch": {"city": 1}}], "filter": {"city": city}},
+                {"items": [{"id": users[0].id, "patch": {"city": 1}}, {"id": users[0].id, "patch": {"city": 2}}]},
+                {"items": [{"id": users[0].id, "patch": {"first_name": None}}]},
+                {"filter": {"city": city}, "patch": {"is_admin": None}},
+        ):
+            response = await admin_client.post("/private/users/bulk-update", json=body)
+            assert response.status_code == 422
+
+        # Под фильтр попадает больше пользователей, чем разрешено изменять одним запросом
+        monkeypatch.setattr(settings, "bulk_update_max_matched", 1)
+        response = await admin_client.post("/private/users/bulk-update", json={
+            "filter": {"city": city + 1}, "patch": {"additional_info": "слишком много"}
+        })
+        assert response.status_code == 400
+        assert not await User.filter(additional_info="слишком много").exists()
+    finally:
+        for user in users:
+            await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_admin_bulk_delete_users(admin_client: AsyncClient, monkeypatch):
+    # Маленькие части, чтобы удаление шло в несколько запросов
+    monkeypatch.setattr(settings, "bulk_chunk_size", 2)
+    city = uuid.uuid4().int % 1000000 + 1000
+    users = [
+        await UserService.create_user_service(CreateUser(
+            first_name="BulkDelete",
+            last_name=f"User{index}",
+            email=generate_unique_email("bulk_delete"),
+            password="bulkpassword",
+            is_admin=False,
+            city=city if index < 5 else None,
+        ))
+        for index in range(7)
+    ]
+    try:
+        # По фильтру: сначала только подсчет
+        response = await admin_client.post("/private/users/bulk-delete", json={"filter": {"city": city}, "dry_run": True})
+        assert response.status_code == 200
+        assert response.json() == {"deleted": 5, "dry_run": True}
+        assert await User.filter(city=city).count() == 5
+
+        response = await admin_client.post("/private/users/bulk-delete", json={"filter": {"city": city}})
+        assert response.json() == {"deleted": 5, "dry_run": False}
+        assert not await User.filter(city=city).exists()
+
+        # По списку id, отсутствующие id не учитываются
+        ids = [users[5].id, users[6].id, users[0].id]
+        response = await admin_client.post("/private/users/bulk-delete", json={"ids": ids, "dry_run": True})
+        assert response.json() == {"deleted": 2, "dry_run": True}
+        response = await admin_client.post("/private/users/bulk-delete", json={"ids": ids})
+        assert response.json() == {"deleted": 2, "dry_run": False}
+        assert not await User.filter(id__in=ids).exists()
+
+        for body in ({"filter": {}}, {"ids": [1], "filter": {"city": city}}, {"dry_run": True}):
+            response = await admin_client.post("/private/users/bulk-delete", json=body)
+            assert response.status_code == 422
+    finally:
+        for user in users:
+            await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_admin_get_user_if_none_match(admin_client: AsyncClient, admin_user):
+    response = await admin_client.get(f"/private/users/{admin_user.id}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    # Версия не изменилась: 304 без тела
+    response = await admin_client.get(f"/private/users/{admin_user.id}", headers={"If-None-Match": f'"0.0", W/{etag}'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    # После изменения возвращается новое представление, время изменения обновлено
+    updated_at = (await User.get(id=admin_user.id)).updated_at
+    await UserService.update_user(admin_user.id, PrivateUpdateUser(city=5))
+    assert (await User.get(id=admin_user.id)).updated_at > updated_at
+    response = await admin_client.get(f"/private/users/{admin_user.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["city"] == 5
+    assert response.headers["etag"] != etag
+
+    response = await admin_client.get(f"/private/users/{admin_user.id + 100000}", headers={"If-None-Match": etag})
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_admin_user_changes_feed(admin_client: AsyncClient, monkeypatch):
+    # Изменения попадают в ленту сразу, без задержки
+    monkeypatch.setattr(settings, "changes_settle_seconds", 0)
+
+    async def read_feed(cursor, limit):
+        changes = []
+        while True:
+            params = {"limit": limit, **({"since": cursor} if cursor else {})}
+            response = await admin_client.get("/private/users/changes", params=params)
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page["data"]) <= limit
+            changes.extend(page["data"])
+            cursor = page["next"]
+            if not page["has_more"]:
+                return changes, cursor
+
+    # Дочитываем ленту до конца, чтобы получить курсор на текущий момент
+    _, cursor = await read_feed(None, 100)
+    changes, same_cursor = await read_feed(cursor, 100)
+    assert changes == []
+    assert same_cursor == cursor
+
+    users = [
+        await UserService.create_user_service(CreateUser(
+            first_name="Changes",
+            last_name=f"User{index}",
+            email=generate_unique_email("changes"),
+            password="changespassword",
+            is_admin=False,
+        ))
+        for index in range(4)
+    ]
+    try:
+        response = await admin_client.patch(f"/private/users/{users[0].id}", json={"city": 77})
+        assert response.status_code == 200
+        response = await admin_client.delete(f"/private/users/{users[1].id}")
+        assert response.status_code == 204
+        response = await admin_client.post("/private/users/bulk-delete", json={"ids": [users[2].id]})
+        assert response.json()["deleted"] == 1
+
+        # Читаем маленькими страницами: изменения не теряются на границах страниц
+        changes, cursor = await read_feed(cursor, 2)
+        latest = {change["id"]: change for change in changes}
+        assert set(latest) == {user.id for user in users}
+        assert latest[users[0].id]["op"] == "upsert"
+        assert latest[users[0].id]["user"]["city"] == 77
+        assert latest[users[1].id] == {**latest[users[1].id], "op": "delete", "user": None}
+        assert latest[users[2].id]["op"] == "delete"
+        assert latest[users[3].id]["user"]["email"] == users[3].email
+        changed_at = [change["changed_at"] for change in changes]
+        assert changed_at == sorted(changed_at)
+
+        # После изменения в ленте появляется только измененный пользователь
+        response = await admin_client.patch(f"/private/users/{users[3].id}", json={"phone": "+70000000000"})
+        assert response.status_code == 200
+        changes, cursor = await read_feed(cursor, 2)
+        assert [(change["op"], change["id"]) for change in changes] == [("upsert", users[3].id)]
+
+        response = await admin_client.get("/private/users/changes", params={"since": "not-a-cursor"})
+        assert response.status_code == 400
+    finally:
+        for user in users:
+            await UserService.delete_user(user.id)
@@ -1,8 +1,10 @@
 from datetime import datetime, timedelta
 
+import pytest
 from jose import jwt
 
 from app.core.auth import create_access_token
+from app.db.models import User
 from app.core.auth import get_password_hash, verify_password
 from app.core.config import settings
 
@@ -22,15 +24,25 @@ def test_create_access_token():
     assert token_exp > datetime.utcnow()
 
 
-def test_password_hashing_and_verification():
+def test_create_access_token_with_user_claims():
+    user = User(id=7, email="claims@example.com", is_admin=True, token_version=3)
+    token = create_access_token({"sub": user.email}, user=user)
+
+    payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    assert payload["sub"] == "claims@example.com"
+    assert (payload["uid"], payload["is_admin"], payload["tv"]) == (7, True, 3)
+
+
+@pytest.mark.asyncio
+async def test_password_hashing_and_verification():
     password = "securepassword"
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash(password)
 
     # Проверяем, что хешированный пароль отличается от исходного
     assert hashed_password != password
 
     # Проверяем, что функция verify_password возвращает True для правильного пароля
-    assert verify_password(password, hashed_password) == True
+    assert await verify_password(password, hashed_password) == True
 
     # Проверяем, что функция verify_password возвращает False для неправильного пароля
-    assert verify_password("wrongpassword", hashed_password) == False
+    assert await verify_password("wrongpassword", hashed_password) == False
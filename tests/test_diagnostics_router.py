@@ -0,0 +1,20 @@
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio
+async def test_diagnostics_for_admin(admin_client: AsyncClient):
+    response = await admin_client.get("/private/diagnostics")
+    assert response.status_code == 200
+    data = response.json()
+    assert "pool" in data["db_pool"]
+    assert data["password_hasher"]["operations"]["verify"]["count"] >= 1
+    assert "hits" in data["principal_cache"]
+    assert "hits" in data["token_versions"]
+    assert "imports" in data["startup"]["phases_ms"]
+
+
+@pytest.mark.asyncio
+async def test_diagnostics_forbidden_for_regular_user(user_client: AsyncClient):
+    response = await user_client.get("/private/diagnostics")
+    assert response.status_code == 403
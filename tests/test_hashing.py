@@ -0,0 +1,65 @@
+import pytest
+from fastapi import HTTPException
+
+from app.core.hashing import PasswordHasher, get_hash_rounds, password_hasher
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_hash_and_verify():
+    password_hash = await password_hasher.hash("poolpassword")
+
+    # Проверяем, что пароль проверяется через тот же пул
+    assert await password_hasher.verify("poolpassword", password_hash) is True
+    assert await password_hasher.verify("wrongpassword", password_hash) is False
+
+    stats = password_hasher.stats()
+    assert stats["operations"]["hash"]["count"] >= 1
+    assert stats["operations"]["verify"]["count"] >= 2
+    assert stats["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_rejects_when_queue_is_full():
+    hasher = PasswordHasher(executor_type="thread", workers=1, max_queue=0)
+    try:
+        # При переполненной очереди операция отклоняется без обращения к bcrypt
+        with pytest.raises(HTTPException) as exc_info:
+            await hasher.hash("password")
+        assert exc_info.value.status_code == 503
+        assert hasher.stats()["rejected"] == 1
+        assert "hash" not in hasher.stats()["operations"]
+    finally:
+        hasher.shutdown()
+
+
+def test_password_hasher_unknown_executor():
+    with pytest.raises(ValueError):
+        PasswordHasher(executor_type="unknown")
+
+
+def test_password_hasher_calibrate_respects_bounds():
+    hasher = PasswordHasher(rounds=12)
+    # Бюджет меньше времени минимальной стоимости: остается минимальная стоимость
+    assert hasher.calibrate(target_seconds=0, min_rounds=4, max_rounds=6) == 4
+    # Большой бюджет: стоимость ограничена сверху
+    assert hasher.calibrate(target_seconds=60, min_rounds=4, max_rounds=6) == 6
+    assert hasher.stats()["rounds"] == 6
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_needs_rehash():
+    hasher = PasswordHasher(rounds=5)
+    try:
+        password_hash = await hasher.hash("password")
+        assert get_hash_rounds(password_hash) == 5
+        assert hasher.needs_rehash(password_hash) is False
+
+        # Хеш с большей стоимостью, чем целевая, не пересчитывается
+        hasher.rounds = 4
+        assert hasher.needs_rehash(password_hash) is False
+
+        hasher.rounds = 6
+        assert hasher.needs_rehash(password_hash) is True
+        assert hasher.needs_rehash("not-a-bcrypt-hash") is False
+    finally:
+        hasher.shutdown()
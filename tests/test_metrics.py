@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from tortoise.transactions import in_transaction
+
+from app.core.config import settings
+from app.core.metrics import Histogram, db_query_duration, get_instrumented_pool, instrument_connection
+from app.db.models import User
+
+
+def test_histogram_render():
+    histogram = Histogram("test_duration_seconds", "Тестовая гистограмма", ("route",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, route="/users/{pk}")
+    histogram.observe(0.5, route="/users/{pk}")
+    histogram.observe(5.0, route="/users/{pk}")
+
+    lines = histogram.render()
+    assert "# TYPE test_duration_seconds histogram" in lines
+    assert 'test_duration_seconds_bucket{route="/users/{pk}",le="0.1"} 1' in lines
+    assert 'test_duration_seconds_bucket{route="/users/{pk}",le="1"} 2' in lines
+    assert 'test_duration_seconds_bucket{route="/users/{pk}",le="+Inf"} 3' in lines
+    assert 'test_duration_seconds_count{route="/users/{pk}"} 3' in lines
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client: AsyncClient):
+    # Запрос к маршруту с параметром учитывается по шаблону маршрута
+    await client.get("/private/users/123456")
+    await client.post("/users/login", json={"email": "nobody@example.com", "password": "password"})
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'route="/private/users/{pk}"' in body
+    assert 'http_request_duration_seconds_count{method="POST",route="/users/login",status="400"}' in body
+    assert 'db_query_duration_seconds_count{operation="select"}' in body
+
+
+@pytest.mark.asyncio
+async def test_queries_in_transaction_are_timed(initialize_db):
+    def select_count():
+        return db_query_duration.samples().get(("select",), ([], 0.0, 0))[2]
+
+    before = select_count()
+    async with in_transaction() as connection:
+        await User.filter(id=0).using_db(connection).count()
+    assert select_count() == before + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_requires_token(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", "scrape-token")
+    response = await client.get("/metrics")
+    assert response.status_code == 401
+    response = await client.get("/metrics", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+    response = await client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_pool_waiters_are_counted():
+    released = asyncio.Event()
+
+    class FakePool:
+        def get_size(self):
+            return 1
+
+        async def acquire(self):
+            await released.wait()
+            return "connection"
+
+    class FakeClient:
+        connection_name = "fake"
+
+        async def create_pool(self):
+            return FakePool()
+
+        async def execute_query(self, query, values=None):
+            return 0, []
+
+        execute_query_dict = execute_insert = execute_many = execute_query
+
+    instrument_connection(FakeClient())
+    pool = await FakeClient().create_pool()
+    assert get_instrumented_pool("fake") is pool
+    assert pool.get_size() == 1
+
+    waiter = asyncio.create_task(pool.acquire())
+    await asyncio.sleep(0)
+    assert pool.waiters == 1
+    released.set()
+    assert await waiter == "connection"
+    assert pool.waiters == 0
@@ -0,0 +1,100 @@
+import time
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.hashing import password_hasher
+from app.core.rate_limit import (
+    DatabaseRateLimitStore,
+    MemoryRateLimitStore,
+    RateLimitStore,
+    get_client_ip,
+    login_rate_limiter,
+)
+from app.db.models import RateLimitBucket
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("store_class", [MemoryRateLimitStore, DatabaseRateLimitStore])
+async def test_rate_limit_store_token_bucket(store_class, initialize_db):
+    store = store_class()
+    key = f"test:{uuid.uuid4()}"
+    # Емкость 2 токена, пополнение 1 токен в минуту
+    assert await store.take(key, 2, 1 / 60) == 0
+    assert await store.take(key, 2, 1 / 60) == 0
+    retry_after = await store.take(key, 2, 1 / 60)
+    assert 0 < retry_after <= 60
+
+    # Корзины разных ключей независимы
+    assert await store.take(f"{key}:other", 2, 1 / 60) == 0
+    await store.clear()
+    assert await store.take(key, 2, 1 / 60) == 0
+
+
+@pytest.mark.asyncio
+async def test_database_store_cleanup_keeps_other_scopes(initialize_db, monkeypatch):
+    monkeypatch.setattr(DatabaseRateLimitStore, "CLEANUP_EVERY", 1)
+    store = DatabaseRateLimitStore()
+    suffix = uuid.uuid4()
+    now = time.time()
+    # Обе корзины не использовались 10 минут: корзина ip уже наполнилась, корзина email с медленным
+    # пополнением еще нет, хотя по параметрам ip она тоже считалась бы наполненной
+    await RateLimitBucket.create(key=f"ip:stale-{suffix}", tokens=0, updated_at=now - 600)
+    await RateLimitBucket.create(key=f"email:slow-{suffix}", tokens=0, updated_at=now - 600)
+    try:
+        assert await store.take(f"ip:new-{suffix}", 2, 1) == 0
+        assert not await RateLimitBucket.filter(key=f"ip:stale-{suffix}").exists()
+        assert await RateLimitBucket.filter(key=f"email:slow-{suffix}").exists()
+    finally:
+        await store.clear()
+
+
+@pytest.mark.asyncio
+async def test_login_rate_limited_before_bcrypt(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(settings, "login_rate_limit_enabled", True)
+    monkeypatch.setattr(settings, "login_rate_limit_email_capacity", 2)
+    monkeypatch.setattr(login_rate_limiter, "store", MemoryRateLimitStore())
+    email = f"stuffing_{uuid.uuid4()}@example.com"
+
+    for _ in range(2):
+        response = await client.post("/users/login", json={"email": email, "password": "wrongpassword"})
+        assert response.status_code == 400
+
+    # Третья попытка отклоняется без проверки пароля
+    verify_count = password_hasher.stats()["operations"].get("verify", {}).get("count", 0)
+    response = await client.post("/users/login", json={"email": email, "password": "wrongpassword"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    assert password_hasher.stats()["operations"].get("verify", {}).get("count", 0) == verify_count
+    assert login_rate_limiter.stats()["rejected_email"] >= 1
+
+    # Email в другом регистре попадает в ту же корзину
+    response = await client.post("/users/login", json={"email": email.upper(), "password": "wrongpassword"})
+    assert response.status_code == 429
+
+
+def test_rate_limit_store_is_abstract():
+    with pytest.raises(TypeError):
+        RateLimitStore()
+
+
+def make_request(client_ip: str, forwarded_for: str = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    return Request({"type": "http", "headers": headers, "client": (client_ip, 12345)})
+
+
+def test_client_ip_from_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(settings, "trusted_proxies", [])
+    # Без доверенных прокси заголовок игнорируется
+    assert get_client_ip(make_request("10.0.0.5", "203.0.113.7")) == "10.0.0.5"
+
+    monkeypatch.setattr(settings, "trusted_proxies", ["10.0.0.0/8"])
+    assert get_client_ip(make_request("10.0.0.5", "203.0.113.7")) == "203.0.113.7"
+    # Подставленный клиентом адрес левее реального не учитывается
+    assert get_client_ip(make_request("10.0.0.5", "198.51.100.1, 203.0.113.7, 10.0.0.6")) == "203.0.113.7"
+    # Запрос не от доверенного прокси: заголовок мог подделать сам клиент
+    assert get_client_ip(make_request("192.0.2.10", "203.0.113.7")) == "192.0.2.10"
+    assert get_client_ip(make_request("10.0.0.5")) == "10.0.0.5"
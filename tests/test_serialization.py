@@ -0,0 +1,16 @@
+import json
+from datetime import date
+
+from app.core import serialization
+from app.core.serialization import FastJSONResponse, dumps
+
+
+def test_dumps_with_and_without_orjson(monkeypatch):
+    content = {"name": "Иван", "birthday": date(1990, 1, 2), "city": None}
+    expected = {"name": "Иван", "birthday": "1990-01-02", "city": None}
+    assert json.loads(dumps(content)) == expected
+
+    # Без orjson используется стандартный модуль json
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(dumps(content)) == expected
+    assert FastJSONResponse(content).body == dumps(content)
@@ -1,9 +1,10 @@
 import pytest
 from httpx import AsyncClient
 
+from app.core import auth
 from app.db.models import User
-from app.schemas.user_schema import CreateUser, LoginModel
-from app.services.user_service import UserService
+from app.schemas.user_schema import CreateUser, LoginModel, UpdateUser
+from app.services.user_service import UserService, principal_cache
 
 
 @pytest.mark.asyncio
@@ -86,7 +87,7 @@ async def test_login_user(client: AsyncClient):
 
 
 @pytest.mark.asyncio
-async def test_get_current_user_data(client: AsyncClient):
+async def test_get_current_user_data(client: AsyncClient, monkeypatch):
     # Создаем пользователя через сервис
     user_data = CreateUser(
         first_name="Alice",
@@ -124,6 +125,22 @@ async def test_get_current_user_data(client: AsyncClient):
         assert data["email"] == "alice@example.com"
         assert data["first_name"] == "Alice"
         created_user = user
+
+        # Повторный запрос с If-None-Match и той же версией возвращает 304 без тела
+        etag = response.headers["etag"]
+        response = await client.get("/users/current", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+        # После изменения пользователя возвращается новое представление, токен декодируется один раз
+        decoded = []
+        decode_access_token = auth.decode_access_token
+        monkeypatch.setattr(auth, "decode_access_token", lambda request: decoded.append(1) or decode_access_token(request))
+        await UserService.update_user(user.id, UpdateUser(phone="5544332211"))
+        response = await client.get("/users/current", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["phone"] == "5544332211"
+        assert len(decoded) == 1
     finally:
         # Удаляем созданного пользователя
         if created_user:
@@ -186,3 +203,62 @@ async def test_update_current_user(client: AsyncClient):
         if created_user:
             delete_result = await UserService.delete_user(created_user.id)
             assert delete_result, f"Не удалось удалить пользователя с ID {created_user.id}."
+
+
+@pytest.mark.asyncio
+async def test_current_user_is_cached_and_invalidated(client: AsyncClient):
+    user = await UserService.create_user_service(CreateUser(
+        first_name="Cache",
+        last_name="Principal",
+        email="cache.principal@example.com",
+        password="cachepassword",
+        is_admin=False,
+    ))
+    try:
+        login_response = await client.post(
+            "/users/login", json={"email": "cache.principal@example.com", "password": "cachepassword"}
+        )
+        assert login_response.status_code == 200
+        principal_cache.clear()
+
+        # Первый запрос идет в базу данных, повторный обслуживается из кэша
+        hits_before = principal_cache.stats()["hits"]
+        assert (await client.get("/users/current")).status_code == 200
+        response = await client.get("/users/current")
+        assert response.status_code == 200
+        assert principal_cache.stats()["hits"] == hits_before + 1
+
+        # Обновление пользователя сбрасывает запись в кэше
+        await UserService.update_user(user.id, UpdateUser(first_name="Renamed"))
+        response = await client.get("/users/current")
+        assert response.json()["first_name"] == "Renamed"
+    finally:
+        await UserService.delete_user(user.id)
+
+    # После удаления токен пользователя больше не действует
+    response = await client.get("/users/current")
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_register_user_duplicate_email(client: AsyncClient):
+    user_data = {
+        "first_name": "Twice",
+        "last_name": "Registered",
+        "email": "twice.registered@example.com",
+        "password": "twicepassword",
+        "is_admin": False
+    }
+    created_user = None
+    try:
+        response = await client.post("/users/register", json=user_data)
+        assert response.status_code == 200
+        created_user = await User.get(email=user_data["email"])
+
+        # Повторная регистрация с тем же email возвращает ошибку клиента, а не 500
+        response = await client.post("/users/register", json=user_data)
+        assert response.status_code == 400
+        assert response.json()["message"] == "Пользователь с таким email уже существует"
+    finally:
+        if created_user:
+            await UserService.delete_user(created_user.id)
@@ -1,9 +1,19 @@
+import asyncio
 import uuid
 
 import pytest
+from fastapi import HTTPException
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+from tortoise.transactions import in_transaction
 
-from app.schemas.user_schema import CreateUser, UpdateUser
-from app.services.user_service import UserService
+from app.core.config import settings
+from app.core.hashing import get_hash_rounds, password_hasher
+from app.db.models import User
+from app.schemas.user_schema import CreateUser, PrivateUpdateUser, UpdateUser, USERS_LIST_FIELDS
+from app.services.user_changes_service import UserChangesService
+from app.services.user_search_service import UserSearchService, user_search_index
+from app.services.user_service import UserService, is_duplicate_email, users_count_cache
 
 
 @pytest.mark.asyncio
@@ -77,6 +87,80 @@ async def test_update_user_success(initialize_db):
         await UserService.delete_user(user.id)
 
 
+@pytest.mark.asyncio
+async def test_update_user_empty_patch(initialize_db):
+    user = await UserService.create_user_service(CreateUser(
+        first_name="Empty",
+        last_name="Patch",
+        email=f"empty_patch_{uuid.uuid4()}@example.com",
+        password="emptypassword",
+        is_admin=False,
+    ))
+    try:
+        # Пустое изменение возвращает запись без новой версии и времени изменения
+        updated_user = await UserService.update_user(user.id, PrivateUpdateUser())
+        assert updated_user.version == user.version
+        assert updated_user.updated_at == (await User.get(id=user.id)).updated_at
+        assert await UserService.update_user(9999, PrivateUpdateUser()) is None
+    finally:
+        await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+@pytest.mark.postgres
+async def test_update_user_returning_postgres(initialize_db):
+    if User._meta.db.capabilities.dialect != "postgres":
+        pytest.skip("UPDATE ... RETURNING проверяется только на PostgreSQL")
+    user = await UserService.create_user_service(CreateUser(
+        first_name="Returning",
+        last_name="Postgres",
+        email=f"returning_{uuid.uuid4()}@example.com",
+        password="returningpassword",
+        is_admin=False,
+    ))
+    try:
+        updated_user = await UserService.update_user(
+            user.id, PrivateUpdateUser(first_name="Updated", is_admin=True), expected_version=user.version
+        )
+        assert (updated_user.first_name, updated_user.is_admin) == ("Updated", True)
+        assert updated_user.version == user.version + 1
+        assert updated_user.token_version == user.token_version + 1
+        assert updated_user.search_key == "updated postgres"
+        # Запись возвращается как загруженная из базы данных
+        assert updated_user._saved_in_db
+        stored = await User.get(id=user.id)
+        assert (stored.version, stored.token_version) == (updated_user.version, updated_user.token_version)
+
+        # Устаревшая версия не применяется
+        with pytest.raises(HTTPException) as exc_info:
+            await UserService.update_user(user.id, PrivateUpdateUser(phone="1"), expected_version=user.version)
+        assert exc_info.value.status_code == 412
+    finally:
+        await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_update_user_duplicate_email(initialize_db):
+    users = [
+        await UserService.create_user_service(CreateUser(
+            first_name="Duplicate",
+            last_name=f"Email{index}",
+            email=f"update_duplicate_{uuid.uuid4()}@example.com",
+            password="duplicatepassword",
+            is_admin=False,
+        ))
+        for index in range(2)
+    ]
+    try:
+        with pytest.raises(HTTPException) as exc_info:
+            await UserService.update_user(users[0].id, UpdateUser(email=users[1].email))
+        assert exc_info.value.status_code == 400
+        assert (await User.get(id=users[0].id)).email == users[0].email
+    finally:
+        for user in users:
+            await UserService.delete_user(user.id)
+
+
 @pytest.mark.asyncio
 async def test_update_user_nonexistent(initialize_db):
     # Попытка обновления несуществующего пользователя
@@ -93,3 +177,242 @@ async def test_delete_user_nonexistent(initialize_db):
     # Попытка удаления несуществующего пользователя
     result = await UserService.delete_user(9999)  # Предполагаемый несуществующий ID
     assert result == False
+
+
+@pytest.mark.asyncio
+async def test_count_users_cached_strategy(initialize_db, monkeypatch):
+    monkeypatch.setattr(settings, "users_count_strategy", "cached")
+    users_count_cache.clear()
+
+    total, strategy = await UserService.count_users()
+    assert strategy == "cached"
+
+    # Создание пользователя сбрасывает кэшированное количество
+    user = await UserService.create_user_service(CreateUser(
+        first_name="Count",
+        last_name="Cached",
+        email=f"count_cached_{uuid.uuid4()}@example.com",
+        password="countpassword",
+        is_admin=False,
+    ))
+    try:
+        total_after_create, _ = await UserService.count_users()
+        assert total_after_create == total + 1
+    finally:
+        await UserService.delete_user(user.id)
+
+    # Удаление также сбрасывает кэш
+    total_after_delete, _ = await UserService.count_users()
+    assert total_after_delete == total
+
+
+@pytest.mark.asyncio
+async def test_count_users_cached_after_filter_field_update(initialize_db, monkeypatch):
+    monkeypatch.setattr(settings, "users_count_strategy", "cached")
+    users_count_cache.clear()
+
+    user = await UserService.create_user_service(CreateUser(
+        first_name="Count",
+        last_name="City",
+        email=f"count_city_{uuid.uuid4()}@example.com",
+        password="countpassword",
+        is_admin=False,
+        city=101,
+    ))
+    try:
+        in_old_city, _ = await UserService.count_users({"city": 101})
+        in_new_city, _ = await UserService.count_users({"city": 102})
+
+        # Изменение города сбрасывает кэшированное количество для обоих фильтров
+        await UserService.update_user(user.id, UpdateUser(city=102))
+        assert (await UserService.count_users({"city": 101}))[0] == in_old_city - 1
+        assert (await UserService.count_users({"city": 102}))[0] == in_new_city + 1
+    finally:
+        await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_count_users_estimate_strategy(initialize_db, monkeypatch):
+    monkeypatch.setattr(settings, "users_count_strategy", "estimate")
+
+    total, strategy = await UserService.count_users()
+    # Если оценка планировщика недоступна, используется точный подсчет
+    assert strategy in ("estimate", "exact")
+    assert total >= 0
+
+
+@pytest.mark.asyncio
+async def test_update_user_password(initialize_db):
+    user_email = f"update_password_{uuid.uuid4()}@example.com"
+    user = await UserService.create_user_service(CreateUser(
+        first_name="Update",
+        last_name="Password",
+        email=user_email,
+        password="oldpassword",
+        is_admin=False,
+    ))
+    try:
+        # Новый пароль сохраняется в виде хеша
+        updated_user = await UserService.update_user(user.id, PrivateUpdateUser(password="newpassword"))
+        assert updated_user.version == user.version + 1
+        assert await UserService.authenticate_user(user_email, "newpassword") is not None
+        assert await UserService.authenticate_user(user_email, "oldpassword") is None
+        assert updated_user.token_version == user.token_version + 1
+
+        # password: null не меняет пароль и не отзывает токены
+        unchanged_user = await UserService.update_user(user.id, PrivateUpdateUser(password=None))
+        assert unchanged_user.token_version == updated_user.token_version
+        assert await UserService.authenticate_user(user_email, "newpassword") is not None
+    finally:
+        await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_authenticate_user_rehashes_password(initialize_db, monkeypatch):
+    monkeypatch.setattr(password_hasher, "rounds", 4)
+    user = await UserService.create_user_service(CreateUser(
+        first_name="Rehash",
+        last_name="User",
+        email=f"rehash_{uuid.uuid4()}@example.com",
+        password="rehashpassword",
+        is_admin=False,
+    ))
+    try:
+        assert get_hash_rounds(user.password_hash) == 4
+
+        # Целевая стоимость выросла: после успешного входа хеш пересчитывается в фоне
+        monkeypatch.setattr(password_hasher, "rounds", 5)
+        assert await UserService.authenticate_user(user.email, "rehashpassword") is not None
+        await asyncio.gather(*UserService._rehash_tasks)
+
+        password_hash = (await User.get(id=user.id)).password_hash
+        assert get_hash_rounds(password_hash) == 5
+        assert await UserService.authenticate_user(user.email, "rehashpassword") is not None
+        assert not UserService._rehash_tasks
+    finally:
+        await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+async def test_get_users_with_field_projection(initialize_db):
+    users = [
+        await UserService.create_user_service(CreateUser(
+            first_name="Projection",
+            last_name=f"User{index}",
+            email=f"projection_{index}_{uuid.uuid4()}@example.com",
+            password="projectionpassword",
+            is_admin=False,
+            additional_info="длинный текст",
+        ))
+        for index in range(3)
+    ]
+    try:
+        ids = [user.id for user in users]
+        filters = {"id__in": ids}
+        # Читаются только запрошенные столбцы, хеш пароля не загружается
+        rows, next_id = await UserService.get_users_after(None, 2, filters=filters, fields=USERS_LIST_FIELDS)
+        assert [row["id"] for row in rows] == ids[:2]
+        assert set(rows[0]) == set(USERS_LIST_FIELDS)
+        assert next_id == ids[1]
+
+        rows = await UserService.get_users(page=2, size=2, filters=filters, fields=USERS_LIST_FIELDS)
+        assert rows == [{"id": ids[2], "first_name": "Projection", "last_name": "User2", "email": users[2].email}]
+    finally:
+        for user in users:
+            await UserService.delete_user(user.id)
+
+
+def test_is_duplicate_email():
+    # SQLite сообщает столбец, asyncpg - имя ограничения
+    assert is_duplicate_email(IntegrityError("UNIQUE constraint failed: users.email"))
+    assert not is_duplicate_email(IntegrityError("NOT NULL constraint failed: users.first_name"))
+
+    class UniqueViolation(Exception):
+        constraint_name = "users_email_key"
+
+    class NotNullViolation(Exception):
+        constraint_name = None
+
+    assert is_duplicate_email(IntegrityError(UniqueViolation("duplicate key value")))
+    assert not is_duplicate_email(IntegrityError(NotNullViolation('null value in column "is_admin"')))
+
+
+@pytest.mark.asyncio
+async def test_search_index_rebuilds_after_max_age(initialize_db, monkeypatch):
+    if await UserSearchService._trigram_available():
+        pytest.skip("поиск выполняется в PostgreSQL через pg_trgm")
+    monkeypatch.setattr(settings, "search_index_rebuild_seconds", 60)
+    await UserSearchService.search("Перестроение", 10)
+
+    # Запись, созданная в обход сервиса (например, другим процессом), не попадает в построенный индекс
+    user = await User.create(
+        first_name="Индекс",
+        last_name="Перестроенович",
+        email=f"search_rebuild_{uuid.uuid4()}@example.com",
+        password_hash="hash",
+        search_key="индекс перестроенович",
+    )
+    try:
+        assert user.id not in [row["id"] for row in await UserSearchService.search("Перестроенович", 10)]
+
+        monkeypatch.setattr(user_search_index, "built_at", user_search_index.built_at - 60)
+        assert user.id in [row["id"] for row in await UserSearchService.search("Перестроенович", 10)]
+    finally:
+        await UserService.delete_user(user.id)
+
+
+@pytest.mark.asyncio
+@pytest.mark.postgres
+async def test_changes_wait_for_open_transactions_postgres(initialize_db):
+    if User._meta.db.capabilities.dialect != "postgres":
+        pytest.skip("граница ленты по открытым транзакциям проверяется только на PostgreSQL")
+    users = [
+        await UserService.create_user_service(CreateUser(
+            first_name="Watermark",
+            last_name=f"User{index}",
+            email=f"watermark_{uuid.uuid4()}@example.com",
+            password="watermarkpassword",
+            is_admin=False,
+        ))
+        for index in range(2)
+    ]
+
+    async def read_feed(users_position, tombstones_position):
+        changes = []
+        while True:
+            data, users_position, tombstones_position, has_more = await UserChangesService.get_changes(
+                users_position, tombstones_position, 100
+            )
+            changes.extend(data)
+            if not has_more:
+                return changes, users_position, tombstones_position
+
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_writer():
+        # Транзакция начинается раньше, чем соседнее изменение, а фиксируется позже
+        async with in_transaction() as connection:
+            await User.filter(id=users[0].id).using_db(connection).update(city=1, updated_at=timezone.now())
+            started.set()
+            await release.wait()
+
+    try:
+        _, users_position, tombstones_position = await read_feed(None, None)
+        writer = asyncio.create_task(slow_writer())
+        await started.wait()
+        try:
+            await User.filter(id=users[1].id).update(city=2, updated_at=timezone.now())
+            # Курсор не уходит дальше начала открытой транзакции, иначе ее изменение было бы пропущено
+            changes, next_users, next_tombstones = await read_feed(users_position, tombstones_position)
+            assert users[0].id not in [change["id"] for change in changes]
+            assert users[1].id not in [change["id"] for change in changes]
+        finally:
+            release.set()
+            await writer
+
+        changes, _, _ = await read_feed(next_users, next_tombstones)
+        assert [change["id"] for change in changes if change["id"] in {users[0].id, users[1].id}] == \
+            [users[0].id, users[1].id]
+    finally:
+        for user in users:
+            await UserService.delete_user(user.id)